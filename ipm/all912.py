@@ -5,10 +5,115 @@
 import datetime
 import helpers
 import string
-import csv
 
 # Import from local directories
-from intrf_specs import Standard_Header, Standard_Fields
+from intrf_specs import Layout, Standard_Header, Standard_Fields
+
+
+# Global variables
+# Specifications of the detail record fields: number, name, length, default value, padding type, dynamic, field inherited from
+specs = (
+    (1, "Group", 4, "INTR", " ", False, None),
+    (2, "Acquirer ID", 6, "513086", "0", False, None),
+    (3, "Transaction Type", 2, "05", " ", False, None),
+    (4, "Reversal Indicator", 1, "", " ", False, None),
+    (5, "Transaction Mode", 2, "M", " ", False, None),
+    (6, "Transaction Source", 2, "PO", " ", False, None),
+    (7, "Transaction Date", 6, "", " ", False, None), # Set for each record in start()
+    (8, "Card No.", 19, "5573********9999", " ", False, None),
+    (9, "Authorization Code", 6, "", "0", True, None),
+    (10, "Card Scheme ID", 1, "M", " ", False, None),
+    (11, "Additional Info", 21, "", " ", False, None),
+    (12, "Visa Settlement Flag", 1, "", " ", False, None),
+    (13, "Fraud Indicator", 1, "", " ", False, None),
+    (14, "Source Amount In Trans. Cur.", 13, "", "amount", True, None),
+    (15, "Transaction Sign", 2, "DB", " ", False, None), # CR for credit transactions
+    (16, "Trans. Currency Code", 3, "EUR", " ", False, None),
+    (17, "Amount In Settlement Currency", 13, "", "amount", False, 14),
+    (18, "Amount Sign", 2, "", " ", False, 15),
+    (19, "Settlement Currency Code", 3, "EUR", " ", False, None),
+    (20, "Merchant Name", 25, "", " ", False, None), # Set for each record in start()
+    (21, "MCC", 4, "5999", "0", False, None),
+    (22, "Town", 13, "Vegas", " ", False, None),
+    (23, "State", 3, "ITA", " ", False, None),
+    (24, "Agency Of Current Acc.", 4, "", "0", False, None),
+    (25, "Current Account No.", 20, "600501992609", " ", False, None),
+    (26, "Current Account Currency", 3, "", " ", False, 19),
+    (27, "Amount In Acct. Currency", 13, "", "amount", False, 17),
+    (28, "Amount Sign", 2, "", " ", False, 15),
+    (29, "Transaction Fee In Current Acct. Currency", 9, "0", "amount", False, None),
+    (30, "Trans. Fee Sign", 2, "", " ", False, 15),
+    (31, "Trans. Amount In CAMS Account Currency", 13, "", "amount", False, 17),
+    (32, "Amount Sign", 2, "", " ", False, 15),
+    (33, "Trans. Fee In CAMS Account Currency", 9, "", "amount", False, 29),
+    (34, "Trans. Fee Sign", 2, "", " ", False, 15),
+    (35, "Exchange Rate", 11, "", "0", True, None),
+    (36, "Exchange Rate Exponent", 2, "00", "0", False, None), # This value is recalculated for eaach message whenever field 35 (exchange rate) is set via dynaset
+    (37, "Cash Back Amount", 9, "", "amount", False, None),
+    (38, "Token Type", 2, "", " ", False, None),
+    (39, "Token Assurance Level", 3, "", " ", False, None),
+    (40, "Interchange Indicator", 1, "C", " ", False, None),
+    (41, "CAMSII Transaction Type", 5, "01635", "0", False, None),
+    (42, "Terminal ID", 10, "", " ", False, None),
+    (43, "Current Account No. Extension", 3, "", " ", False, None),
+    (44, "Destination Amount", 13, "", "amount", False, 17),
+    (45, "Destination Amount Sign", 2, "", " ", False, 15),
+    (46, "Destination Amount Currency", 3, "", " ", False, 19),
+    (47, "Regular Points Amount", 13, "", "amount", False, None),
+    (48, "File ID", 15, "", "0", False, None),
+    (49, "Uplift Amount", 15, "", "amount", False, None),
+    (50, "Exchange Rate Applied", 15, "000000010000000", " ", False, None),
+    (51, "ARN", 23, "", "0", True, None),
+    (52, "Bank Account Exchange Rate Applied", 11, "", " ", False, 35),
+    (53, "Bank Account Exchange Rate Exponent", 4, "", "0", False, 36),
+    (54, "Mastercard Reconciliation Date/Visa Central Processing Date", 6, "", " ", False, 7),
+    (55, "Visa ISA Fee Flag", 1, "", " ", False, None),
+    (56, "Interchange Fee", 9, "5", "0", False, None),
+    (57, "Transaction ID", 15, "", " ", True, None),
+    (58, "Visa Multiple Clearing Sequence Number", 2, "", " ", False, None),
+    (59, "Visa Multiple Clearing Sequence Count", 2, "", " ", False, None),
+    (60, "Sender Name", 30, "", " ", False, None),
+    (61, "Sender Address", 35, "", " ", False, None),
+    (62, "Sender City", 25, "", " ", False, None),
+    (63, "Sender State\\Province CD", 3, "", " ", False, None),
+    (64, "Sender Country", 3, "", " ", False, None),
+    (65, "Message Reason Code", 4, "", "0", False, None),
+    (66, "Transaction Level 5", 3, "", " ", False, None),
+    (67, "Token", 19, "", " ", False, None),
+    (68, "Token Requestor ID", 11, "", "0", False, None),
+    (69, "Settlement Date", 6, "", " ", False, 7),
+    (70, "Operator ID", 8, "CAN4DC71", " ", False, None),
+    (71, "Receiving Time Stamp", 20, "", " ", False, None), # Set for each record in start()
+    (72, "External Bank Code", 6, "000600", " ", False, None),
+    (73, "Released Outstanding Authorization Amount", 15, "", "amount", False, None),
+    (74, "Ancillary Fee Code 1", 2, "", " ", False, None),
+    (75, "Ancillary Fee Amount 1", 12, "", "amount", False, None),
+    (76, "Ancillary Fee Code 2", 2, "", " ", False, None),
+    (77, "Ancillary Fee Amount 2", 12, "", "amount", False, None),
+    (78, "Ancillary Fee Code 3", 2, "", " ", False, None),
+    (79, "Ancillary Fee Amount 3", 12, "", "amount", False, None),
+    (80, "Ancillary Fee Code 4", 2, "", " ", False, None),
+    (81, "Ancillary Fee Amount 4", 12, "", "amount", False, None),
+    (82, "Ancillary Fee Code 5", 2, "", " ", False, None),
+    (83, "Ancillary Fee Amount 5", 12, "", "amount", False, None),
+    (84, "Ancillary Fee Code 6", 2, "", " ", False, None),
+    (85, "Ancillary Fee Amount 6", 12, "", "amount", False, None),
+    (86, "Payment Additional Information", 3, "", " ", False, None),
+    (87, "Currency Conversion Date", 6, "", " ", False, 7),
+    (88, "Initiated Via Remote Payment Channel", 2, "", " ", False, None),
+    (89, "Customer Authentication", 3, "", " ", False, None),
+    (90, "Card Payment Information", 3, "", " ", False, None),
+    (91, "Remote Payment Information", 10, "", " ", False, None),
+    (92, "Merchant ID", 15, "000100000179533", " ", False, None),
+    (93, "Device Type", 2, "", " ", False, None),
+    (94, "Low-risk Merchant Indicator", 2, "", " ", False, None),
+    (95, "Original Trace ID", 15, "", " ", False, None),
+    (96, "Currency Conversion Date Indicator", 1, "1", " ", False, None),
+    (97, "ECB Rate Deviation", 15, "", " ", False, None),
+    (98, "Terminal Type ID", 3, "NA", " ", False, None),
+    (99, "Filler", 221, "", " ", False, None),
+)
+layout = Layout(specs) # Validated once and shared by all records
 
 
 class Interface():
@@ -18,38 +123,6 @@ class Interface():
         self.field = self.Fields()
         self.filename = self.Filename.get()
 
-    @property
-    def records(self):
-        return self._records
-    
-    @records.setter
-    def records(self, reader):
-        if not isinstance(reader, csv.DictReader):
-            raise ValueError(f"Invalid records.setter type: {type(reader)}")
-        
-        self._records = []
-        
-        for row in reader:
-            message = ""
-            self.field.start(row["Scenario"], row["Preset"])
-
-            # Assign values to fields
-            for i in range(2, self.field.count + 2):
-                field_n = i - 1
-                field_id = reader.fieldnames[i]
-                self.field.set(field_n, row[field_id])
-
-            # Generate message and store it in the records list
-            for i in range(2, self.field.count + 2):
-                field_n = i - 1
-                message += self.field.val[field_n]
-            self.records.append(message)
-
-            # Update header
-            self.header.update(*self.field.header_info)  
-            
-        return self._records
-
 
     class Header(Standard_Header):
         """Defines the attribute of the header record and its subfields"""
@@ -90,367 +163,21 @@ class Interface():
     class Fields(Standard_Fields):
         """Defines the attributes of detail record fields"""
         def __init__(self):
-            super().__init__(count = 99)
+            super().__init__(layout)
 
         def start(self, scenario, user_preset):
-            """Sets the value of subclass objects, except for dynamic objects, which are set in the dynaset or inherit methods"""
+            """Resets the fields for a new record, then sets the default values changing from one record to the next"""
             super().start()
 
-            # Define the default value and properties of each record field
-
-            # Field 1 - Group
-            self.len[1] = 4
-            self.def_val[1] = "INTR"
-            # Field 2 - Acquirer ID
-            self.len[2] = 6
-            self.def_val[2] = "513086"
-            self.padding_type[2] = "0"
-            # Field 3 - Transaction Type
-            self.len[3] = 2
-            self.def_val[3] = "05"
-            # Field 4 - Reversal Indicator
-            self.len[4] = 1
-            self.def_val[4] = ""
-            # Field 5 - Transaction Mode
-            self.len[5] = 2
-            self.def_val[5] = "M"
-            # Field 6 - Transaction Source
-            self.len[6] = 2
-            self.def_val[6] = "PO"
             # Field 7 - Transaction Date
-            self.len[7] = 6
             self.def_val[7] = datetime.date.today().strftime("%y%m%d")
-            # Field 8 - Card No.
-            self.len[8] = 19
-            self.def_val[8] = "5573********9999"
-            # Field 9 - Authorization Code
-            self.len[9] = 6
-            self.dynamic[9] = True
-            self.def_val[9] = ""
-            self.padding_type[9] = "0"
-            # Field 10 - Card Scheme ID
-            self.len[10] = 1
-            self.def_val[10] = "M"
-            # Field 11 - Additional Info
-            self.len[11] = 21
-            self.def_val[11] = ""
-            # Field 12 - Visa Settlement Flag
-            self.len[12] = 1
-            self.def_val[12] = ""
-            # Field 13 - Fraud Indicator
-            self.len[13] = 1
-            self.def_val[13] = ""
-            # Field 14 - Source Amount In Trans. Cur.
-            self.len[14] = 13
-            self.dynamic[14] = True
-            self.padding_type[14] = "amount"
-            self.def_val[14] = ""
-            # Field 15 - Transaction Sign
-            self.len[15] = 2
-            self.def_val[15] = "DB" # CR for credit transactions
-            # Field 16 - Trans. Currency Code
-            self.len[16] = 3
-            self.def_val[16] = "EUR"
-            # Field 17 - Amount In Settlement Currency
-            self.len[17] = 13
-            self.inheritance[17] = 14
-            self.padding_type[17] = "amount"
-            self.def_val[17] = ""
-            # Field 18 - Amount Sign
-            self.len[18] = 2
-            self.inheritance[18] = 15
-            self.def_val[18] = ""
-            # Field 19 - Settlement Currency Code
-            self.len[19] = 3
-            self.def_val[19] = "EUR"
             # Field 20 - Merchant Name
-            self.len[20] = 25
             if scenario:
                 self.def_val[20] = scenario
             else:
                 self.def_val[20] = "Untitled"
-            # Field 21 - MCC
-            self.len[21] = 4
-            self.def_val[21] = "5999"
-            self.padding_type[21] = "0"
-            # Field 22 - Town
-            self.len[22] = 13
-            self.def_val[22] = "Vegas"
-            # Field 23 - State
-            self.len[23] = 3
-            self.def_val[23] = "ITA"
-            # Field 24 - Agency Of Current Acc.
-            self.len[24] = 4
-            self.padding_type[24] = "0"
-            self.def_val[24] = ""
-            # Field 25 - Current Account No.
-            self.len[25] = 20
-            self.def_val[25] = "600501992609"
-            # Field 26 - Current Account Currency
-            self.len[26] = 3
-            self.inheritance[26] = 19
-            self.def_val[26] = ""
-            # Field 27 - Amount In Acct. Currency
-            self.len[27] = 13
-            self.inheritance[27] = 17
-            self.padding_type[27] = "amount"
-            self.def_val[27] = ""
-            # Field 28 - Amount Sign
-            self.len[28] = 2
-            self.inheritance[28] = 15
-            self.def_val[28] = ""
-            # Field 29 - Transaction Fee In Current Acct. Currency
-            self.len[29] = 9
-            self.def_val[29] = "0"
-            self.padding_type[29] = "amount"
-            # Field 30 - Trans. Fee Sign
-            self.len[30] = 2
-            self.inheritance[30] = 15
-            self.def_val[30] = ""
-            # Field 31 - Trans. Amount In CAMS Account Currency
-            self.len[31] = 13
-            self.padding_type[31] = "amount"
-            self.inheritance[31] = 17
-            self.def_val[31] = ""
-            # Field 32 - Amount Sign
-            self.len[32] = 2
-            self.inheritance[32] = 15
-            self.def_val[32] = ""
-            # Field 33 - Trans. Fee In CAMS Account Currency
-            self.len[33] = 9
-            self.inheritance[33] = 29
-            self.padding_type[33] = "amount"
-            self.def_val[33] = ""
-            # Field 34 - Trans. Fee Sign
-            self.len[34] = 2
-            self.inheritance[34] = 15
-            self.def_val[34] = ""
-            # Field 35 - Exchange Rate
-            self.len[35] = 11
-            self.dynamic[35] = True
-            self.padding_type[35] = "0"
-            self.def_val[35] = ""
-            # Field 36 - Exchange Rate Exponent
-            self.len[36] = 2
-            self.def_val[36] = "00" # This value is recalculated for eaach message whenever field 35 (exchange rate) is set via dynaset
-            self.padding_type[36] = "0"
-            # Field 37 - Cash Back Amount
-            self.len[37] = 9
-            self.padding_type[37] = "amount"
-            self.def_val[37] = ""
-            # Field 38 - Token Type
-            self.len[38] = 2
-            self.def_val[38] = ""
-            # Field 39 - Token Assurance Level
-            self.len[39] = 3
-            self.def_val[39] = ""
-            # Field 40 - Interchange Indicator
-            self.len[40] = 1
-            self.def_val[40] = "C"
-            # Field 41 - CAMSII Transaction Type
-            self.len[41] = 5
-            self.def_val[41] = "01635"
-            self.padding_type[41] = "0"
-            # Field 42 - Terminal ID
-            self.len[42] = 10
-            self.def_val[42] = ""
-            # Field 43 - Current Account No. Extension
-            self.len[43] = 3
-            self.def_val[43] = ""
-            # Field 44 - Destination Amount
-            self.len[44] = 13
-            self.inheritance[44] = 17
-            self.padding_type[44] = "amount"
-            self.def_val[44] = ""
-            # Field 45 - Destination Amount Sign
-            self.len[45] = 2
-            self.inheritance[45] = 15
-            self.def_val[45] = ""
-            # Field 46 - Destination Amount Currency
-            self.len[46] = 3
-            self.inheritance[46] = 19
-            self.def_val[46] = ""
-            # Field 47 - Regular Points Amount
-            self.len[47] = 13
-            self.padding_type[47] = "amount"
-            self.def_val[47] = ""
-            # Field 48 - File ID
-            self.len[48] = 15
-            self.padding_type[48] = "0"
-            self.def_val[48] = ""
-            # Field 49 - Uplift Amount
-            self.len[49] = 15
-            self.padding_type[49] = "amount"
-            self.def_val[49] = ""
-            # Field 50 - Exchange Rate Applied
-            self.len[50] = 15
-            self.def_val[50] = "000000010000000"
-            # Field 51 - ARN
-            self.len[51] = 23
-            self.dynamic[51] = True
-            self.padding_type[51] = "0"
-            self.def_val[51] = ""
-            # Field 52 - Bank Account Exchange Rate Applied
-            self.len[52] = 11
-            self.inheritance[52] = 35
-            self.def_val[52] = ""
-            # Field 53 - Bank Account Exchange Rate Exponent
-            self.len[53] = 4
-            self.inheritance[53] = 36
-            self.padding_type[53] = "0"
-            self.def_val[53] = ""
-            # Field 54 - Mastercard Reconciliation Date/Visa Central Processing Date
-            self.len[54] = 6
-            self.inheritance[54] = 7
-            self.def_val[54] = ""
-            # Field 55 - Visa ISA Fee Flag
-            self.len[55] = 1
-            self.def_val[55] = ""
-            # Field 56 - Interchange Fee
-            self.len[56] = 9
-            self.def_val[56] = "5"
-            self.padding_type[56] = "0"
-            # Field 57 - Transaction ID
-            self.len[57] = 15
-            self.dynamic[57] = True
-            self.def_val[57] = ""
-            # Field 58 - Visa Multiple Clearing Sequence Number
-            self.len[58] = 2
-            self.def_val[58] = ""
-            # Field 59 - Visa Multiple Clearing Sequence Count
-            self.len[59] = 2
-            self.def_val[59] = ""
-            # Field 60 - Sender Name
-            self.len[60] = 30
-            self.def_val[60] = ""
-            # Field 61 - Sender Address
-            self.len[61] = 35
-            self.def_val[61] = ""
-            # Field 62 - Sender City
-            self.len[62] = 25
-            self.def_val[62] = ""
-            # Field 63 - Sender State\Province CD
-            self.len[63] = 3
-            self.def_val[63] = ""
-            # Field 64 - Sender Country
-            self.len[64] = 3
-            self.def_val[64] = ""
-            # Field 65 - Message Reason Code
-            self.len[65] = 4
-            self.padding_type[65] = "0"
-            self.def_val[65] = ""
-            # Field 66 - Transaction Level 5
-            self.len[66] = 3
-            self.def_val[66] = ""
-            # Field 67 - Token
-            self.len[67] = 19
-            self.def_val[67] = ""
-            # Field 68 - Token Requestor ID
-            self.len[68] = 11
-            self.padding_type[68] = "0"
-            self.def_val[68] = ""
-            # Field 69 - Settlement Date
-            self.len[69] = 6
-            self.inheritance[69] = 7
-            self.def_val[69] = ""
-            # Field 70 - Operator ID
-            self.len[70] = 8
-            self.def_val[70] = "CAN4DC71"
             # Field 71 - Receiving Time Stamp
-            self.len[71] = 20
             self.def_val[71] = datetime.datetime.today().strftime("%Y%m%d%H%M%S%f")
-            # Field 72 - External Bank Code
-            self.len[72] = 6
-            self.def_val[72] = "000600"
-            # Field 73 - Released Outstanding Authorization Amount
-            self.len[73] = 15
-            self.padding_type[73] = "amount"
-            self.def_val[73] = ""
-            # Field 74 - Ancillary Fee Code 1
-            self.len[74] = 2
-            self.def_val[74] = ""
-            # Field 75 - Ancillary Fee Amount 1
-            self.len[75] = 12
-            self.padding_type[75] = "amount"
-            self.def_val[75] = ""
-            # Field 76 - Ancillary Fee Code 2
-            self.len[76] = 2
-            self.def_val[76] = ""
-            # Field 77 - Ancillary Fee Amount 2
-            self.len[77] = 12
-            self.padding_type[77] = "amount"
-            self.def_val[77] = ""
-            # Field 78 - Ancillary Fee Code 3
-            self.len[78] = 2
-            self.def_val[78] = ""
-            # Field 79 - Ancillary Fee Amount 3
-            self.len[79] = 12
-            self.padding_type[79] = "amount"
-            self.def_val[79] = ""
-            # Field 80 - Ancillary Fee Code 4
-            self.len[80] = 2
-            self.def_val[80] = ""
-            # Field 81 - Ancillary Fee Amount 4
-            self.len[81] = 12
-            self.padding_type[81] = "amount"
-            self.def_val[81] = ""
-            # Field 82 - Ancillary Fee Code 5
-            self.len[82] = 2
-            self.def_val[82] = ""
-            # Field 83 - Ancillary Fee Amount 5
-            self.len[83] = 12
-            self.padding_type[83] = "amount"
-            self.def_val[83] = ""
-            # Field 84 - Ancillary Fee Code 6
-            self.len[84] = 2
-            self.def_val[84] = ""
-            # Field 85 - Ancillary Fee Amount 6
-            self.len[85] = 12
-            self.padding_type[85] = "amount"
-            self.def_val[85] = ""
-            # Field 86 - Payment Additional Information
-            self.len[86] = 3
-            self.def_val[86] = ""
-            # Field 87 - Currency Conversion Date
-            self.len[87] = 6
-            self.inheritance[87] = 7
-            self.def_val[87] = ""
-            # Field 88 - Initiated Via Remote Payment Channel
-            self.len[88] = 2
-            self.def_val[88] = ""
-            # Field 89 - Customer Authentication
-            self.len[89] = 3
-            self.def_val[89] = ""
-            # Field 90 - Card Payment Information
-            self.len[90] = 3
-            self.def_val[90] = ""
-            # Field 91 - Remote Payment Information
-            self.len[91] = 10
-            self.def_val[91] = ""
-            # Field 92 - Merchant ID
-            self.len[92] = 15
-            self.def_val[92] = "000100000179533"
-            # Field 93 - Device Type
-            self.len[93] = 2
-            self.def_val[93] = ""
-            # Field 94 - Low-risk Merchant Indicator
-            self.len[94] = 2
-            self.def_val[94] = ""
-            # Field 95 - Original Trace ID
-            self.len[95] = 15
-            self.def_val[95] = ""
-            # Field 96 - Currency Conversion Date Indicator
-            self.len[96] = 1
-            self.def_val[96] = "1"
-            # Field 97 - ECB Rate Deviation
-            self.len[97] = 15
-            self.def_val[97] = ""
-            # Field 98 - Terminal Type ID
-            self.len[98] = 3
-            self.def_val[98] = "NA"
-            # Field 99 - Filler
-            self.len[99] = 221
-            self.def_val[99] = ""
 
             self.preset(user_preset)
 
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+
+"""Times the generation and the parsing of the clearing files at several input sizes and saves the results as JSON.
+Results can be compared with the ones saved from another commit via --compare"""
+
+
+# Import from the Standard Library
+import sys
+import os
+import csv
+import itertools
+import tempfile
+
+# Import from local directories
+import all912
+import all907
+import parser
+from ipm import records
+
+# The timing and the reports are shared with the benchmarks of the ISO simulator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "iso"))
+import bench_iso
+
+
+# Global variables
+interfaces = {
+    # Interface, input file
+    "gdf": (all912, "gdf.csv"),
+    "pdd": (all907, "pdd.csv")
+}
+workdir = tempfile.TemporaryDirectory() # Batch files generated for the parser, removed at exit
+
+
+def template(filetype, size):
+    """Returns the field names of an input file and size rows, repeating the ones in the file"""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "in", interfaces[filetype][1]), encoding="utf-8-sig") as infile:
+        reader = csv.DictReader(infile)
+        rows = list(reader)
+    return reader.fieldnames, [dict(row) for row in itertools.islice(itertools.cycle(rows), size)]
+
+
+def generate(filetype, size):
+    """Returns size records of an interface, generated from its input file"""
+    fieldnames, rows = template(filetype, size)
+    return list(records(rows, fieldnames, interfaces[filetype][0].Interface()))
+
+
+def generation(filetype):
+    """Times the generation of records, as done by ipm.py"""
+    def setup(size):
+        fieldnames, rows = template(filetype, size)
+        def work():
+            for record in records(rows, fieldnames, interfaces[filetype][0].Interface()):
+                pass
+        return work
+    return setup
+
+
+def decoding(filetype):
+    """Times Layout.decode, as used by parser.py on a single record"""
+    def setup(size):
+        layout = interfaces[filetype][0].layout
+        batch = generate(filetype, size)
+        def work():
+            for record in batch:
+                layout.decode(record)
+        return work
+    return setup
+
+
+def scanning(filetype):
+    """Times parser.scan on a whole batch file, reading every field"""
+    def setup(size):
+        layout = interfaces[filetype][0].layout
+        path = os.path.join(workdir.name, f"{filetype}.{size}")
+        interface = interfaces[filetype][0].Interface()
+        with open(path, "w") as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow([interface.header])
+            for record in generate(filetype, size):
+                writer.writerow([record])
+        fields = list(range(1, layout.count + 1))
+        def work():
+            for values in parser.scan(path, layout, fields):
+                pass
+        return work
+    return setup
+
+
+def suite():
+    """Returns the benchmarks of the clearing files, by name"""
+    benchmarks = {}
+    for filetype in interfaces:
+        benchmarks[f"records[{filetype}]"] = generation(filetype)
+        benchmarks[f"Layout.decode[{filetype}]"] = decoding(filetype)
+        benchmarks[f"parser.scan[{filetype}]"] = scanning(filetype)
+    return benchmarks
+
+
+if __name__ == "__main__":
+    bench_iso.main(suite())
@@ -1,11 +1,14 @@
 # Import from the Standard Library
 import random
+import zlib
 
 
 # Global variables
 codes = {} 
 # Each dict item is a set of codes which were already used, hence not to be re-used. 
 # The indices represent the number of characters of the items (e.g. codes[6] is a set of six character strings)
+registry = None # When set, codes are checked against the ones issued in previous runs as well, see registry.py
+shard = (0, 1) # Index of this process among the worker processes generating a file, and their number. Without a registry, each of them only issues its own share of the codes
 
 
 def esc(color):
@@ -28,13 +31,17 @@ def esc(color):
 def randgen(population, limit):
     """Generates single use strings pseudo-randomly"""
     global codes
+
+    if registry is not None:
+        return registry.issue(population, limit)
+
     random.seed()
     result = ""
 
     if limit not in codes:
         codes[limit] = {""}
     
-    while result in codes[limit]:
+    while result in codes[limit] or (shard[1] > 1 and zlib.crc32(result.encode()) % shard[1] != shard[0]):
         result = "".join(random.choices(population, k=limit))
 
     codes[limit].add(result)
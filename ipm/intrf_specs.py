@@ -1,6 +1,83 @@
 """Defines common attributes and methods for NEXI interfaces' records"""
 
 
+# Global variables
+padding_types = [" ", "0", "0+", "0-", "amount", "*", "exchange"]
+
+
+def formatter(padding_type, length):
+    """Compiles the padding of a field into a function returning the value at the required length"""
+    match padding_type:
+        case " " | "*":
+            return lambda val: val.ljust(length, padding_type)
+        case "0":
+            return lambda val: val.rjust(length, "0")
+        case "0+" | "0-":
+            # Empty values become a bare sign followed by zeros
+            sign = padding_type[1]
+            return lambda val: (val or sign).ljust(length, "0") if length > 0 else val
+        case "amount":
+            # Values not already at full length are in units and converted to cents
+            return lambda val: (str(round(float(val) * 100)) if len(val) != length and val != "" else val).rjust(length, "0")
+        case "exchange":
+            return lambda val: val.ljust(length, "0")
+        case _:
+            return lambda val: val
+
+
+class Layout():
+    """Specifications of the detail record fields of an interface, validated once and shared by all records.
+    Each specification is a tuple: number, name, length, default value, padding type, dynamic, field inherited from (or None)"""
+    def __init__(self, specs):
+        # Reserve field 0. Fields are 1 indexed in ALL interfaces
+        self.count = len(specs) # Number of fields
+        self.name = ["Reserved"] # Field name
+        self.len = [0] # Field length
+        self.def_val = [""] # Static default value, presets and dynamic fields may change it for a single record
+        self.padding_type = [" "] # Defines what character to use when applying padding
+        self.dynamic = [False] # Defines whether the field's default value is set dynamically, presets may change it for a single record
+        self.inheritance = {} # Defines values for fields inheriting them from other fields
+        self.offset = [0] # Position of the field in the record
+
+        for n, spec in enumerate(specs, start=1):
+            if len(spec) != 7:
+                raise ValueError(f"Field {n}: expected 7 specifications, got {len(spec)}")
+            number, name, length, def_val, padding_type, dynamic, inheritance = spec
+            if number != n:
+                raise ValueError(f"Field {n}: specifications out of order, found field {number}")
+            if not isinstance(length, int) or length < 0:
+                raise ValueError(f"Field {n}: invalid length {length}")
+            if len(def_val) > length:
+                raise ValueError(f"Field {n}: default value exceeds maximum length {length}")
+            if padding_type not in padding_types:
+                raise ValueError(f"Field {n}: invalid padding type {padding_type}")
+            if inheritance is not None:
+                if not 1 <= inheritance <= self.count or inheritance == n:
+                    raise ValueError(f"Field {n}: can't inherit from field {inheritance}")
+                self.inheritance[n] = inheritance
+
+            self.name.append(name)
+            self.len.append(length)
+            self.def_val.append(def_val)
+            self.padding_type.append(padding_type)
+            self.dynamic.append(dynamic)
+            self.offset.append(self.offset[-1] + self.len[-2])
+
+        # Records only read the specifications, so they can all share the same ones
+        self.name = tuple(self.name)
+        self.len = tuple(self.len)
+        self.def_val = tuple(self.def_val)
+        self.padding_type = tuple(self.padding_type)
+        self.dynamic = tuple(self.dynamic)
+        self.offset = tuple(self.offset)
+        self.width = self.offset[-1] + self.len[-1] # Length of a record
+        self.formatters = tuple(formatter(padding_type, length) for padding_type, length in zip(self.padding_type, self.len))
+
+    def decode(self, record):
+        """Splits a record into its field values, indexed by field number"""
+        return ["Reserved"] + [record[self.offset[n]:self.offset[n] + self.len[n]] for n in range(1, self.count + 1)]
+
+
 class Standard_Header():
     def __init__(self, subfield_count=0):
         self.val = "" # Value of the entire header
@@ -8,7 +85,7 @@ class Standard_Header():
         self.subfield_val = [] # Subfield value
         self.subfield_len = [] # Subfield length
         self.subfield_padding_type = [] # Defines what character to use when applying padding
-        self.accounts = [] # Count of distinct accounts
+        self.accounts = set() # Distinct accounts
 
         # Reserve subfield 0. Subfields are 1 indexed in ALL interfaces
         self.subfield_val.append("Reserved")
@@ -22,52 +99,42 @@ class Standard_Header():
             self.subfield_padding_type.append("0")
     
     def __str__(self):
-        """Concatenates the header record subfields to get the final header record value"""
-        # Normalize subfield values
+        """Concatenates the header record subfields to get the header record value.
+        Counters are left untouched, so the header can be rendered as a placeholder before the records and again after them"""
+        self.val = ""
         for i in range(1, self.subfield_count):
-            if isinstance(self.subfield_val[i], int):
-                self.subfield_val[i] = str(self.subfield_val[i])
-            while len(self.subfield_val[i]) != self.subfield_len[i]:
-                self.subfield_val[i] = self.subfield_padding_type[i] + self.subfield_val[i]
-            self.val += self.subfield_val[i]
+            self.val += str(self.subfield_val[i]).rjust(self.subfield_len[i], self.subfield_padding_type[i])
 
         return self.val
 
+    def merge(self, other):
+        """Adds the totals of another header of the same interface, e.g. built by another process for part of the records"""
+        for i in range(1, self.subfield_count + 1):
+            if isinstance(self.subfield_val[i], int):
+                self.subfield_val[i] += other.subfield_val[i]
+        self.accounts |= other.accounts
+
 
 class Standard_Fields():
-    def __init__(self, count=0):
-        self.count = count # Number of fields
-        self.val = [] # Field value
-        self.len = [] # Field length
-        self.dynamic = [] # Defines whether the field's default value is set dynamically
-        self.def_val = [] # Defines static default values for non-dynamic fields
-        self.inheritance = {} # Defines values for fields inheriting them from other fields
-        self.padding_type = [] # Defines what character to use when applying padding
+    def __init__(self, layout):
+        self.layout = layout # Specifications of the fields, see Layout
+        self.count = layout.count # Number of fields
+        self.val = ["Reserved"] + ["" for i in range(self.count)] # Field value
+        self.len = layout.len # Field length
+        self.dynamic = list(layout.dynamic) # Defines whether the field's default value is set dynamically
+        self.def_val = list(layout.def_val) # Defines static default values for non-dynamic fields
+        self.inheritance = layout.inheritance # Defines values for fields inheriting them from other fields
+        self.padding_type = layout.padding_type # Defines what character to use when applying padding
         self.amount_counter = 0 # Counter for default values of fields containing amounts of some kind
 
-        # Reserve field 0. Fields are 1 indexed in ALL912
-        self.val.append("Reserved")
-        self.len.append(0)
-        self.dynamic.append(False)
-        self.def_val.append("")
-        self.padding_type.append(" ")
-
-        # Initialize fields from 1 to self.count
-        for i in range(self.count):
-            self.val.append("")
-            self.len.append(0)
-            self.dynamic.append(False)
-            self.def_val.append("")
-            self.padding_type.append(" ")
-
     def start(self):
-        """Sets the value of subclass objects, except for dynamic objects, which are set in the dynaset or inherit methods"""
+        """Resets the default values and dynamic flags that presets and dynamic fields may have changed for the previous record"""
         # Update counters
         self.amount_counter += 1
 
-        # Reset dynamic flags
-        for i in range(self.count + 1):
-            self.dynamic[i] = False
+        # Only what a record can change is copied, the rest is shared with the layout
+        self.dynamic = list(self.layout.dynamic)
+        self.def_val = list(self.layout.def_val)
         
     def inherit(self, n):
         """Sets values for fields inheriting them from other fields"""
@@ -97,36 +164,11 @@ class Standard_Fields():
         if len(self.val[n]) > self.len[n]:
             raise ValueError(f"Value of field {n} exceeds maximum length {self.len[n]}")
 
-        match self.padding_type[n]:
-            case " ":
-                while len(self.val[n]) != self.len[n]:
-                    self.val[n] += self.padding_type[n]
-            case "0":
-                while len(self.val[n]) != self.len[n]:
-                    self.val[n] = self.padding_type[n] + self.val[n]
-            case "0+":
-                while len(self.val[n]) != self.len[n]:
-                    if len(self.val[n]) == 0:
-                        self.val[n] = "+"
-                    else:
-                        self.val[n] = self.val[n] + "0" 
-            case "0-":
-                while len(self.val[n]) != self.len[n]:
-                    if len(self.val[n]) == 0:
-                        self.val[n] = "-"
-                    else :
-                        self.val[n] =  self.val[n] + "0" 
-            case "amount":
-                if len(self.val[n]) != self.len[n] and self.val[n] != "":
-                    self.val[n] = str(round(float(self.val[n]) * 100))
-                while len(self.val[n]) != self.len[n]:
-                    self.val[n] = "0" + self.val[n]
-            case "*":
-                while len(self.val[n]) != self.len[n]:
-                    self.val[n] += self.padding_type[n]            
-            case "exchange":
-                while len(self.val[n]) != self.len[n]:
-                    self.val[n] += "0"
+        self.val[n] = self.layout.formatters[n](self.val[n])
+
+        # Amounts converted to cents may grow past the field, which would shift every following field
+        if len(self.val[n]) != self.len[n]:
+            raise ValueError(f"Value of field {n} ({self.layout.name[n]}) is {len(self.val[n])} characters long once formatted, expected {self.len[n]}")
 
     def preset(self, preset):
         """Updates default values according to predefined presets"""
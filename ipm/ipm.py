@@ -9,38 +9,77 @@ import sys
 import csv
 import re
 import os
+import random
+import itertools
+import collections
+import multiprocessing
 
 # Import from local directories
 import all912
 import all907
 import w_ftp
+import helpers
+import registry
 from helpers import esc
 
 
+# Global variables
+chunk_size = 1000 # Number of input rows handed to a worker process at once
+
+
 def main():
     args, interface = argparse()
 
+    # Check generated codes against the ones issued in previous runs
+    if args["registry"]:
+        helpers.registry = registry.Registry(args["registry"])
+
     # Open files
     infile = open(args["in_filename"], encoding="utf-8-sig")
     outfile = open(args["out_filename"], "w")
     reader = csv.DictReader(infile)
     writer = csv.writer(outfile)
-    
-    # Generate records
-    interface.records = reader  
 
-    # Write header to the outfile
-    writer.writerow([interface.header])
+    # Reserve the header line: its totals are only known once all records are written, but its width is fixed
+    placeholder = str(interface.header)
+    writer.writerow([placeholder])
 
-    # Write all records to the outfile
-    for record in interface.records:
-        writer.writerow([record])
+    # Write each record to the outfile as soon as it is generated
+    if args["workers"] == 1:
+        for record in records(reader, reader.fieldnames, interface):
+            writer.writerow([record])
+    else:
+        # Workers open the registry on their own, it was only opened here to be rebuilt once if needed
+        if helpers.registry is not None:
+            helpers.registry.close()
+            helpers.registry = None
+
+        counter = multiprocessing.Value("i", 0)
+        with multiprocessing.Pool(args["workers"], initializer=start_worker, initargs=(counter, args["workers"], args["registry"])) as pool:
+            # Chunks are written in the same order as the input rows, keeping a few of them in progress for each worker
+            pending = collections.deque()
+            for first, rows in chunks(reader, chunk_size):
+                pending.append(pool.apply_async(shard, (type(interface), first, rows, reader.fieldnames)))
+                while len(pending) > 2 * args["workers"]:
+                    write_chunk(writer, interface, *pending.popleft().get())
+            while pending:
+                write_chunk(writer, interface, *pending.popleft().get())
+
+    # Overwrite the placeholder with the final header, which must not spill over the first record
+    header = str(interface.header)
+    if len(header) != len(placeholder):
+        outfile.close()
+        sys.exit(f"The header of {args['out_filename']} is {len(header)} characters long, expected {len(placeholder)}: a total doesn't fit its subfield. The file is left with a placeholder header")
+    outfile.seek(0)
+    writer.writerow([header])
 
     print(esc("green") + args["out_filename"] + esc("default") + " generated\n")
 
     # Close files
     infile.close()
     outfile.close()
+    if helpers.registry is not None:
+        helpers.registry.close()
 
     # Send files to Temenos FTP
     if args["transfer"] is True:
@@ -48,6 +87,72 @@ def main():
 
     sys.exit(0)
 
+
+def records(rows, fieldnames, interface):
+    """Generates the records one at a time from the rows of the input file, updating the header totals along the way"""
+    for row in rows:
+        interface.field.start(row["Scenario"], row["Preset"])
+        record = record_writer(row, fieldnames, interface.field)
+        interface.header.update(*interface.field.header_info)
+        yield record
+
+
+def record_writer(row, fieldnames, field):
+    """Assigns values to the fields of a started record and returns the record"""
+    # Columns 0 and 1 are the scenario and the preset, field n is in column n + 1
+    for n in range(1, field.count + 1):
+        field.set(n, row[fieldnames[n + 1]])
+
+    return "".join(field.val[1:field.count + 1])
+
+
+def chunks(reader, size):
+    """Splits the input rows into lists of size rows, each with the number of rows preceding it.
+    Every list but the first starts with the last row of the previous one, see shard"""
+    first = 0
+    previous = []
+    while rows := list(itertools.islice(reader, size)):
+        yield first, previous + rows
+        first += len(rows)
+        previous = rows[-1:]
+
+
+def start_worker(counter, workers, path):
+    """Sets up a worker process: gives it its share of the codes and its own connection to the registry"""
+    with counter.get_lock():
+        helpers.shard = (counter.value, workers)
+        counter.value += 1
+
+    # Forked workers would otherwise share the same random state
+    random.seed()
+    if path:
+        helpers.registry = registry.Registry(path)
+
+
+def shard(cls, first, rows, fieldnames):
+    """Generates the records of a chunk of input rows in a worker process. Returns them with the header totals of the chunk"""
+    interface = cls()
+
+    # Amounts are numbered as if the whole file was generated by a single process
+    interface.field.amount_counter = first
+
+    # Some presets take values from the previous record, which is generated again and left out
+    if first > 0:
+        interface.field.amount_counter -= 1
+        interface.field.start(rows[0]["Scenario"], rows[0]["Preset"])
+        record_writer(rows[0], fieldnames, interface.field)
+        rows = rows[1:]
+
+    return list(records(rows, fieldnames, interface)), interface.header
+
+
+def write_chunk(writer, interface, chunk, header):
+    """Writes the records generated by a worker process and adds the header totals of their chunk to the file's"""
+    for record in chunk:
+        writer.writerow([record])
+    interface.header.merge(header)
+
+
 def argparse():
     """Parse arguments and check usage"""
     # Initialize variables
@@ -56,14 +161,16 @@ def argparse():
         "in_filename": "",
         "out_filename": "",
         "t24_env": "",
-        "transfer": ""
+        "transfer": "",
+        "registry": "",
+        "workers": 1
     }
     ipm_path = "/Cards/ipm"
     out_path = ""
 
     # Check correct usage
-    if not 2 <= len(sys.argv) <= 6 or "--help" in sys.argv or "-h" in sys.argv:
-        sys.exit("Correct usage: ./ipm.py --gdf in/'input_file'.csv (out/'output_file'.csv) ([--send, -s]) ([--uat, --upg])")
+    if not 2 <= len(sys.argv) <= 8 or "--help" in sys.argv or "-h" in sys.argv:
+        sys.exit("Correct usage: ./ipm.py --gdf in/'input_file'.csv (out/'output_file'.csv) ([--send, -s]) ([--uat, --upg]) (--registry(=PATH)) (--workers=N)")
 
     # Create out folder if it doesn't exist
     home = os.path.expanduser('~')
@@ -92,6 +199,15 @@ def argparse():
             args["transfer"] = True
         elif arg in ["--upg", "--uat"]:
             args["t24_env"] = arg[2:].upper()
+        elif arg == "--registry":
+            # Codes issued in previous runs are kept next to the out folder
+            args["registry"] = os.path.dirname(out_path) + "/registry.db"
+        elif re.match("^--registry=.+$", arg):
+            args["registry"] = arg[11:]
+        elif re.match("^--workers=[0-9]+$", arg):
+            args["workers"] = int(arg[10:])
+            if args["workers"] < 1:
+                sys.exit("The number of workers must be at least 1")
         else:
             sys.exit(f"{arg} is not a valid argument")
 
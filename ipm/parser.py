@@ -3,7 +3,10 @@
 
 # Import from the Standard Library
 import sys
+import os
 import re
+import csv
+import mmap
 
 # Import from local directories
 import all912
@@ -13,38 +16,103 @@ import all907
 def main():
 
     # Check correct usage
-    if len(sys.argv) != 3:
+    if not 3 <= len(sys.argv) <= 4:
         print("Correct usage: ../parser.py --gdf \'[message]\'")
+        print("               ../parser.py --gdf --file=out/'filename' (--fields=N,N,...)")
         sys.exit(1)
 
     # Check filetype option
     if sys.argv[1] == "--gdf":
-        field = all912.Fields()
+        layout = all912.layout
     elif sys.argv[1] == "--pdd":
-        field = all907.Fields()
+        layout = all907.layout
     else:
         print("Usage: the second argument must be --gdf or --pdd")
         sys.exit(1)
 
-    msg = sys.argv[2]
-    field.start()
-
-    # Iterate over the message
-    cursor = 0
-    next = 0
-    for i in range (1, field.count + 1):
-        next = cursor + field.len[i]
-        # Get the current field value
-        field.val[i] = msg[cursor:next]
-        # Check if it's empty (that is, only composed of blanks)
-        if re.search("^ *$", field.val[i]) == None:
+    # Whole files are printed as CSV, with the requested fields only
+    if sys.argv[2].startswith("--file="):
+        fields = list(range(1, layout.count + 1))
+        if len(sys.argv) == 4:
+            if not re.match("^--fields=[0-9]+(,[0-9]+)*$", sys.argv[3]):
+                print(f"{sys.argv[3]} is not a valid argument")
+                sys.exit(1)
+            fields = [int(n) for n in sys.argv[3][9:].split(",")]
+            for n in fields:
+                if not 1 <= n <= layout.count:
+                    print(f"Field {n} does not exist")
+                    sys.exit(1)
+
+        writer = csv.writer(sys.stdout)
+        writer.writerow([f"{n:03d} - {layout.name[n]}" for n in fields])
+        for values in scan(sys.argv[2][7:], layout, fields):
+            writer.writerow([value.strip() for value in values])
+        sys.exit(0)
+    elif len(sys.argv) == 4:
+        print(f"{sys.argv[3]} is not a valid argument")
+        sys.exit(1)
+
+    # Split the message according to the same specifications used to generate it
+    values = layout.decode(sys.argv[2])
+    for i in range(1, layout.count + 1):
+        # Skip empty fields (that is, only composed of blanks)
+        if values[i].strip() != "":
             # Remove whitespace at the beginning and at the end of the string. Then print to screen
-            field.val[i] = re.sub('^\s+|\s+$', '', field.val[i])
-            print(f"{i:03d}<{field.val[i]}>")
-        cursor = next
+            print(f"{i:03d}<{values[i].strip()}>")
 
     sys.exit(0)
 
 
+def scan(path, layout, fields):
+    """Yields the values of the requested fields for each record of a batch file, without reading more of the file than needed"""
+    slices = [(layout.offset[n], layout.offset[n] + layout.len[n]) for n in fields]
+
+    with open(path, "rb") as file:
+        # Empty files can't be mapped
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Skip the header
+            cursor = data.find(b"\n") + 1
+            if cursor == 0:
+                return
+
+            while cursor < len(data):
+                end = data.find(b"\n", cursor)
+                if end == -1:
+                    end = len(data)
+                stop = end - 1 if data[end - 1:end] == b"\r" else end
+
+                # Plain ASCII records, like the GDF ones, can be sliced by byte offset straight from the file
+                if stop - cursor == layout.width:
+                    try:
+                        yield tuple(data[cursor + start:cursor + finish].decode("ascii") for start, finish in slices)
+                        cursor = end + 1
+                        continue
+                    except UnicodeDecodeError:
+                        pass
+
+                # The others contain multibyte characters, like the PDD ones, or were quoted when written
+                if stop > cursor:
+                    record = data[cursor:stop].decode("utf-8")
+                    if record.startswith('"'):
+                        record = next(csv.reader([record]))[0]
+                    yield tuple(record[start:finish] for start, finish in slices)
+                cursor = end + 1
+
+
+def columns(path, layout, fields):
+    """Returns the values of the requested fields of all the records of a batch file, as a list for each field"""
+    values = {n: [] for n in fields}
+    appends = [values[n].append for n in fields]
+
+    for record in scan(path, layout, fields):
+        for append, value in zip(appends, record):
+            append(value)
+
+    return values
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+
+"""Reconciles the authorizations sent by iso.py with the records of a clearing file (GDF or PDD).
+Items are matched on the approval code, then checked on card, amount and date"""
+
+
+# Import from the Standard Library
+import sys
+import os
+import re
+import csv
+import zlib
+import datetime
+import tempfile
+
+# Import from local directories
+import all912
+import all907
+import parser
+from helpers import esc
+
+# The ISO messages are split by the decoder of the ISO simulator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "iso"))
+import decoder
+
+
+# Global variables
+partition_count = 64 # Number of partitions the items are spread over, only one of them is held in memory at a time
+clearing_fields = {
+    # Approval code, card, amount, date
+    "gdf": (all912.layout, [9, 8, 14, 7]),
+    "pdd": (all907.layout, [80, 6, 8, 15])
+}
+report_fieldnames = ["Status", "Side", "Line", "Approval Code", "Card", "Amount", "Date", "Matched Line"]
+
+
+def main():
+    args = argparse()
+
+    authorizations = read_authorizations(args["auth_filename"])
+    clearing = read_clearing(args["clearing_filename"], args["filetype"])
+
+    with open(args["report_filename"], "w") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(report_fieldnames)
+        counts = reconcile(authorizations, clearing, writer)
+
+    print(esc("green") + args["report_filename"] + esc("default") + " generated\n")
+    for status, count in counts.items():
+        print(f"{status}: {count}")
+
+    sys.exit(0)
+
+
+def read_authorizations(path):
+    """Yields the approved authorizations and advices of an iso.py output file as (line, approval code, card, amount, date)"""
+    with open(path, encoding="utf-8-sig") as infile:
+        for line, row in enumerate(csv.DictReader(infile), start=2):
+            # The Response Code column is left empty when iso.py runs without logs, so the action code is read from the response
+            if row["ISO Request"][0:4] not in ["1100", "1120", "1121"] or row["ISO Response"][0:4] not in ["1110", "1130"]:
+                continue
+            response = decoder.Message(row["ISO Response"])
+            if response[39] != "000":
+                continue
+
+            # An authorization without an amount can still match on the approval code, and is reported as partial or unmatched
+            request = decoder.Message(row["ISO Request"])
+            amount = int(request[4]) if request[4].isdigit() else ""
+            yield line, response[38], card(request[2]), amount, request[12][:6]
+
+
+def read_clearing(path, filetype):
+    """Yields the records of a clearing file as (line, approval code, card, amount, date)"""
+    layout, fields = clearing_fields[filetype]
+
+    for line, (approval, number, amount, date) in enumerate(parser.scan(path, layout, fields), start=2):
+        # PDD dates are in the CYYMMDD format
+        yield line, approval.strip(), card(number), int(amount or 0), date.strip()[-6:]
+
+
+def card(number):
+    """Returns the part of a card number that every interface shows, as they mask the middle digits differently"""
+    number = number.strip()
+    return number[:4] + number[-4:]
+
+
+def reconcile(authorizations, clearing, writer):
+    """Matches the two sides partition by partition, writing every item to the report. Returns the number of items for each status"""
+    counts = {"Matched": 0, "Partial": 0, "Duplicate": 0, "Unmatched authorization": 0, "Unmatched clearing": 0}
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Spread both sides over partitions by approval code, so that items that can match end up in the same one
+        for side, items in [("auth", authorizations), ("clearing", clearing)]:
+            files = [open(os.path.join(directory, f"{side}.{i}"), "w", newline="") for i in range(partition_count)]
+            writers = [csv.writer(file) for file in files]
+            for item in items:
+                writers[zlib.crc32(item[1].encode()) % partition_count].writerow(item)
+            for file in files:
+                file.close()
+
+        for i in range(partition_count):
+            with open(os.path.join(directory, f"auth.{i}"), newline="") as file:
+                index = {} # Authorizations of the partition, by approval code. The last item tells whether they were matched
+                for item in csv.reader(file):
+                    candidates = index.setdefault(item[1], [])
+                    duplicate = next((candidate for candidate in candidates if candidate[2:5] == item[2:5]), None)
+                    if duplicate is not None:
+                        counts["Duplicate"] += 1
+                        writer.writerow(["Duplicate", "Authorization"] + item + [duplicate[0]])
+                        continue
+                    candidates.append(item + [False])
+
+            # The clearing side is streamed against the index
+            with open(os.path.join(directory, f"clearing.{i}"), newline="") as file:
+                for item in csv.reader(file):
+                    status, authorization = match(index.get(item[1], []), item)
+                    counts[status] += 1
+                    writer.writerow([status, "Clearing"] + item + [authorization[0] if authorization else ""])
+
+            for authorizations in index.values():
+                for authorization in authorizations:
+                    if authorization[5] is False:
+                        counts["Unmatched authorization"] += 1
+                        writer.writerow(["Unmatched authorization", "Authorization"] + authorization[:5] + [""])
+
+    return counts
+
+
+def match(candidates, item):
+    """Finds the authorization a clearing record belongs to among those with the same approval code, and marks it as matched.
+    Returns the status of the clearing record and the authorization, if any"""
+    if not candidates:
+        return "Unmatched clearing", None
+
+    # An authorization matching on every key first, then one matching on the approval code only
+    for status in ["Matched", "Partial"]:
+        for candidate in candidates:
+            if candidate[5] is False and (status == "Partial" or candidate[2:5] == item[2:5]):
+                candidate[5] = True
+                return status, candidate
+
+    # Every authorization with the same approval code was already cleared
+    return "Duplicate", candidates[0]
+
+
+def argparse():
+    """Parse arguments and check usage"""
+    # Initialize variables
+    args = {
+        "filetype": "",
+        "auth_filename": "",
+        "clearing_filename": "",
+        "report_filename": ""
+    }
+
+    # Check correct usage
+    if not 4 <= len(sys.argv) <= 5 or "--help" in sys.argv or "-h" in sys.argv:
+        sys.exit("Correct usage: ./reconcile.py --gdf --auth=../iso/out/'iso_output'.csv --clearing=out/'clearing_file' (--report=out/'report'.csv)")
+
+    # Parse arguments
+    for arg in sys.argv:
+        if re.match("^.*reconcile.py$", arg):
+            pass
+        elif arg in ["--gdf", "--pdd"]:
+            args["filetype"] = arg[2:]
+        elif re.match("^--auth=.+$", arg):
+            args["auth_filename"] = arg[7:]
+        elif re.match("^--clearing=.+$", arg):
+            args["clearing_filename"] = arg[11:]
+        elif re.match("^--report=.+$", arg):
+            args["report_filename"] = arg[9:]
+        else:
+            sys.exit(f"{arg} is not a valid argument")
+
+    if not args["filetype"]:
+        sys.exit("Select a filetype like '--gdf' or '--pdd'")
+    for key in ["auth_filename", "clearing_filename"]:
+        if not os.path.exists(args[key]):
+            sys.exit(f"{args[key] or key} not found")
+    if not args["report_filename"]:
+        args["report_filename"] = "out/RECON.D" + datetime.date.today().strftime("%y%m%d") + ".T" + datetime.datetime.today().strftime("%H%M%S") + ".csv"
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
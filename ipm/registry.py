@@ -0,0 +1,191 @@
+"""Keeps track of the codes issued in clearing files (ARNs, auth codes, transaction IDs) across runs, so that they are never reused"""
+
+
+# Import from the Standard Library
+import os
+import mmap
+import math
+import random
+import sqlite3
+import hashlib
+import datetime
+
+
+# Global variables
+CAPACITY = 50_000_000 # Number of codes the Bloom filter is sized for
+ERROR_RATE = 0.01 # Share of never issued codes the Bloom filter takes for issued ones, as long as CAPACITY isn't exceeded
+BATCH = 1000 # Maximum number of codes reserved at once for each kind of code
+ATTEMPTS = 100 # Batches generated in a row without a single new code before a kind of code is considered used up
+
+
+class Bloom():
+    """Bloom filter backed by a memory-mapped file: tells for sure when a code was never issued, without reading the database"""
+    HEADER = 16 # Number of bits and number of codes added, 8 bytes each
+
+    def __init__(self, path, capacity=CAPACITY, error_rate=ERROR_RATE):
+        self.bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2) # Size of the filter
+        self.hashes = max(round(self.bits / capacity * math.log(2)), 1) # Number of bits set for each code
+
+        # The file is created sparse, disk space is only used as bits are set
+        if not os.path.exists(path) or os.path.getsize(path) != self.HEADER + (self.bits + 7) // 8:
+            with open(path, "wb") as file:
+                file.truncate(self.HEADER + (self.bits + 7) // 8)
+            self.file = open(path, "r+b")
+            self.map = mmap.mmap(self.file.fileno(), 0)
+            self.map[0:8] = self.bits.to_bytes(8, "big")
+        else:
+            self.file = open(path, "r+b")
+            self.map = mmap.mmap(self.file.fileno(), 0)
+
+    @property
+    def count(self):
+        """Number of codes added to the filter"""
+        return int.from_bytes(self.map[8:16], "big")
+
+    @count.setter
+    def count(self, value):
+        self.map[8:16] = value.to_bytes(8, "big")
+
+    def positions(self, key):
+        """Returns the bits that represent a code"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[0:8], "big")
+        second = int.from_bytes(digest[8:16], "big") | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, key, positions=None):
+        for position in positions or self.positions(key):
+            self.map[self.HEADER + (position >> 3)] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return self.check(self.positions(key))
+
+    def check(self, positions):
+        """Tells whether all the bits in positions are set"""
+        for position in positions:
+            if not self.map[self.HEADER + (position >> 3)] & 1 << (position & 7):
+                return False
+        return True
+
+    def clear(self):
+        self.map[self.HEADER:] = bytes(len(self.map) - self.HEADER)
+        self.count = 0
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class Registry():
+    """Issues codes that were never issued before, reserving them in batches in a SQLite database with a Bloom filter in front.
+    The filter is only written while holding the database's write lock, so that processes sharing the registry keep it in line.
+    Once every code of a kind is issued, the codes issued on the oldest day before today are forgotten and can be issued again"""
+    def __init__(self, path, batch=BATCH):
+        self.batch = batch
+        self.reserved = {} # Codes reserved but not issued yet, for each population and length
+        self.issued = {} # Number of codes issued by this registry, for each population and length
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS codes (code TEXT PRIMARY KEY, day TEXT NOT NULL DEFAULT '') WITHOUT ROWID")
+        # Registries created before codes were dated take their codes for the oldest ones
+        if "day" not in [column[1] for column in self.db.execute("PRAGMA table_info(codes)")]:
+            self.db.execute("ALTER TABLE codes ADD COLUMN day TEXT NOT NULL DEFAULT ''")
+        self.db.execute("CREATE INDEX IF NOT EXISTS codes_day ON codes (day)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        self.db.execute("INSERT OR IGNORE INTO meta VALUES ('count', 0)")
+        self.db.commit()
+        self.bloom = Bloom(path + ".bloom")
+
+        # The filter is rebuilt if it doesn't hold the same codes as the database (e.g. it was deleted)
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            if self.bloom.count != self.count:
+                self.rebuild()
+
+    @property
+    def count(self):
+        """Number of codes issued so far"""
+        return self.db.execute("SELECT value FROM meta WHERE key = 'count'").fetchone()[0]
+
+    def rebuild(self):
+        """Adds every code in the database to an empty Bloom filter"""
+        self.bloom.clear()
+        for key, in self.db.execute("SELECT code FROM codes"):
+            self.bloom.add(key)
+        self.bloom.count = self.count
+
+    def issue(self, population, limit):
+        """Returns a code of limit characters taken from population, which was never issued before"""
+        kind = (population, limit)
+        if not self.reserved.get(kind):
+            self.reserve(population, limit)
+        self.issued[kind] = self.issued.get(kind, 0) + 1
+        return self.reserved[kind].pop()
+
+    def reserve(self, population, limit):
+        """Generates a batch of codes and records them as issued. Codes are keyed by length only, like in helpers.codes.
+        Batches start with a single code and double up to batch, so that short runs don't reserve more than they use"""
+        kind = (population, limit)
+        size = min(max(self.issued.get(kind, 0), 1), self.batch)
+        for attempt in range(ATTEMPTS):
+            candidates = {}
+            for i in range(size):
+                code = "".join(random.choices(population, k=limit))
+                key = f"{limit}:{code}"
+                positions = self.bloom.positions(key)
+                # Codes the filter isn't sure about are simply thrown away, which saves a lookup in the database
+                if not self.bloom.check(positions):
+                    candidates[key] = (code, positions)
+            if not candidates:
+                continue
+
+            with self.db:
+                self.db.execute("BEGIN IMMEDIATE")
+                # Another process may have issued some of the same codes in the meantime: keep only the ones that are still new
+                day = datetime.date.today().isoformat()
+                candidates = {key: code for key, code in candidates.items() if self.db.execute("INSERT OR IGNORE INTO codes VALUES (?, ?)", (key, day)).rowcount == 1}
+                self.db.execute("UPDATE meta SET value = value + ? WHERE key = 'count'", (len(candidates),))
+
+                for key, (code, positions) in candidates.items():
+                    self.bloom.add(key, positions)
+                self.bloom.count = self.bloom.count + len(candidates)
+
+            if candidates:
+                self.reserved.setdefault(kind, []).extend(code for code, positions in candidates.values())
+                return
+
+        # Codes issued today may be in the file being generated, so they are never forgotten
+        if self.expire():
+            return self.reserve(population, limit)
+        raise RuntimeError(f"No new code of {limit} characters found in {ATTEMPTS} attempts, they were all issued today or nearly so")
+
+    def expire(self):
+        """Forgets the codes issued on the oldest day before today, rebuilding the filter without them. Returns how many were forgotten"""
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            day, = self.db.execute("SELECT MIN(day) FROM codes").fetchone()
+            if day is None or day >= datetime.date.today().isoformat():
+                return 0
+            deleted = self.db.execute("DELETE FROM codes WHERE day = ?", (day,)).rowcount
+            self.db.execute("UPDATE meta SET value = value - ? WHERE key = 'count'", (deleted,))
+            self.rebuild()
+        return deleted
+
+    def release(self):
+        """Deletes the codes reserved but not issued from the database, so that later runs can issue them.
+        Their bits stay set in the filter, which takes them for issued ones until it is rebuilt"""
+        keys = [(f"{limit}:{code}",) for (population, limit), codes in self.reserved.items() for code in codes]
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            deleted = self.db.executemany("DELETE FROM codes WHERE code = ?", keys).rowcount
+            self.db.execute("UPDATE meta SET value = value - ? WHERE key = 'count'", (deleted,))
+            self.bloom.count = self.bloom.count - deleted
+        self.reserved = {}
+
+    def close(self):
+        """Gives back the codes reserved but not issued, then closes the database and the Bloom filter"""
+        self.release()
+        self.db.close()
+        self.bloom.close()
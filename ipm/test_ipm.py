@@ -1,10 +1,18 @@
 from unittest.mock import patch
-from ipm import argparse, record_writer, send
+from ipm import argparse, record_writer, send, records, chunks, shard
 import sys
 import re
 import all912
 import all907
 import csv
+import os
+import string
+import registry
+import intrf_specs
+import parser
+import reconcile
+import io
+import pytest
 
 
 def test_argparse_gdf():
@@ -17,6 +25,13 @@ def test_argparse_gdf():
         assert re.fullmatch(r"out/INK01\.D[0-9]{6}\.T[0-9]{6}\.P001", args["out_filename"])
 
 
+def test_argparse_registry():
+    with patch.object(sys, 'argv', ["ipm.py", "--gdf", "in/gdf"]):
+        assert argparse()[0]["registry"] == ""
+    with patch.object(sys, 'argv', ["ipm.py", "--gdf", "in/gdf", "--registry=/tmp/codes.db"]):
+        assert argparse()[0]["registry"] == "/tmp/codes.db"
+
+
 def test_argparse_pdd():
     testargs = ["ipm.py", "--pdd", "in/pdd"]
     with patch.object(sys, 'argv', testargs):
@@ -47,6 +62,144 @@ def test_writer_pdd():
         assert re.match(re_IPM, record_writer(row, reader.fieldnames, interface.field))
 
 
+def test_layout_pdd():
+    infile = open("in/pdd.csv", encoding="utf-8-sig")
+    reader = csv.DictReader(infile)
+    interface = all907.Interface()
+    for row in reader:
+        interface.field.start(row["Scenario"], row["Preset"])
+        record = record_writer(row, reader.fieldnames, interface.field)
+        assert len(record) == all907.layout.width
+        assert all907.layout.decode(record) == interface.field.val
+
+
+def test_layout_errors():
+    with pytest.raises(ValueError):
+        intrf_specs.Layout([(1, "Group", 2, "INTR", " ", False, None)])
+    with pytest.raises(ValueError):
+        intrf_specs.Layout([(1, "Group", 4, "INTR", "?", False, None)])
+    with pytest.raises(ValueError):
+        intrf_specs.Layout([(1, "Group", 4, "INTR", " ", False, 2)])
+    field = intrf_specs.Standard_Fields(intrf_specs.Layout([(1, "Amount", 4, "", "amount", False, None)]))
+    field.set(1, "99")
+    assert field.val[1] == "9900"
+    with pytest.raises(ValueError, match="Amount"):
+        field.set(1, "999")
+
+
+def test_shards_pdd():
+    infile = open("in/pdd.csv", encoding="utf-8-sig")
+    reader = csv.DictReader(infile)
+    rows = list(reader)
+    interface = all907.Interface()
+    expected = list(records(rows, reader.fieldnames, interface))
+    merged = all907.Interface()
+    generated = []
+    for first, chunk in chunks(iter(rows), 3):
+        chunk_records, header = shard(all907.Interface, first, chunk, reader.fieldnames)
+        generated += chunk_records
+        merged.header.merge(header)
+    assert len(generated) == len(expected)
+    assert [all907.layout.decode(record)[8] for record in generated] == [all907.layout.decode(record)[8] for record in expected]
+    assert merged.header.subfield_val == interface.header.subfield_val
+
+
+def test_scan_pdd(tmp_path):
+    infile = open("in/pdd.csv", encoding="utf-8-sig")
+    reader = csv.DictReader(infile)
+    interface = all907.Interface()
+    path = tmp_path / "PDD01.csv"
+    with open(path, "w", encoding="utf-8") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow([interface.header])
+        expected = []
+        for record in records(reader, reader.fieldnames, interface):
+            writer.writerow([record])
+            expected.append(tuple(all907.layout.decode(record)[n] for n in [6, 8, 13, 144]))
+    assert list(parser.scan(path, all907.layout, [6, 8, 13, 144])) == expected
+    assert parser.columns(path, all907.layout, [8])[8] == [values[1] for values in expected]
+
+
+def test_scan_gdf(tmp_path):
+    infile = open("in/gdf.csv", encoding="utf-8-sig")
+    reader = csv.DictReader(infile)
+    interface = all912.Interface()
+    path = tmp_path / "INK01.csv"
+    with open(path, "w", encoding="utf-8") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow([interface.header])
+        expected = []
+        for record in records(reader, reader.fieldnames, interface):
+            # Plain ASCII at full width, so every record is sliced straight from the file
+            assert len(record.encode("utf-8")) == all912.layout.width
+            writer.writerow([record])
+            expected.append(tuple(all912.layout.decode(record)[n] for n in [7, 8, 9, 14]))
+    assert list(parser.scan(path, all912.layout, [7, 8, 9, 14])) == expected
+
+    empty = tmp_path / "empty.csv"
+    empty.touch()
+    assert list(parser.scan(empty, all912.layout, [7])) == []
+
+
+def test_reconcile():
+    authorizations = [(2, "A1", "55739999", 100, "230601"), (3, "B2", "55739999", 200, "230601"), (4, "C3", "55739999", 300, "230601"), (5, "C3", "55739999", 300, "230601")]
+    clearing = [(2, "A1", "55739999", 100, "230601"), (3, "A1", "55739999", 100, "230601"), (4, "B2", "55739999", 250, "230601"), (5, "D4", "55739999", 400, "230601")]
+    report = io.StringIO()
+    counts = reconcile.reconcile(iter(authorizations), iter(clearing), csv.writer(report))
+    assert counts == {"Matched": 1, "Partial": 1, "Duplicate": 2, "Unmatched authorization": 1, "Unmatched clearing": 1}
+    assert len(report.getvalue().splitlines()) == 6
+
+
+def test_read_authorizations(tmp_path):
+    def message(mti, values):
+        bitmap = 0
+        content = ""
+        for n, value in sorted(values.items()):
+            bitmap |= 1 << (128 - n)
+            content += (f"{len(value):02d}" if n == 2 else "") + value
+        return mti + f"{bitmap:032X}" + content
+
+    path = tmp_path / "auth.csv"
+    with open(path, "w", newline="") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(["Scenario", "ISO Request", "ISO Response", "Response Code"])
+        writer.writerow(["Purchase", message("1100", {2: "5573001234569999", 4: "000000001000", 12: "230601120000"}), message("1110", {38: "A1B2C3", 39: "000"}), ""])
+        writer.writerow(["No amount", message("1100", {2: "5573001234569999", 12: "230601120000"}), message("1110", {38: "D4E5F6", 39: "000"}), ""])
+        writer.writerow(["Echo", message("1804", {11: "000001"}), message("1814", {11: "000001", 39: "800"}), ""])
+    authorizations = list(reconcile.read_authorizations(path))
+    assert authorizations == [(2, "A1B2C3", "55739999", 1000, "230601"), (3, "D4E5F6", "55739999", "", "230601")]
+
+    counts = reconcile.reconcile(iter(authorizations), iter([(2, "D4E5F6", "55739999", 500, "230601")]), csv.writer(io.StringIO()))
+    assert (counts["Partial"], counts["Unmatched authorization"]) == (1, 1)
+
+
+def test_registry(tmp_path):
+    path = str(tmp_path / "registry.db")
+    first = registry.Registry(path, batch=50)
+    issued = [first.issue(string.digits, 3) for i in range(400)]
+    first.close()
+    assert len(set(issued)) == 400
+    os.remove(path + ".bloom")
+    second = registry.Registry(path, batch=50)
+    assert second.bloom.count == second.count
+    assert not set(issued) & {second.issue(string.digits, 3) for i in range(300)}
+    second.close()
+
+    # Codes reserved but not issued are given back, and a used up kind of code raises instead of looping forever
+    third = registry.Registry(path)
+    assert third.count == 700 and third.bloom.count == 700
+    binary = {third.issue("XY", 3) for i in range(8)}
+    with pytest.raises(RuntimeError):
+        third.issue("XY", 3)
+    assert len(binary) == 8 and third.count == 708
+
+    # Codes issued on earlier days are forgotten instead, once a kind of code is used up
+    with third.db:
+        third.db.execute("UPDATE codes SET day = '2023-06-01'")
+    assert third.issue("XY", 3) in binary and third.count <= 8
+    third.close()
+
+
 def test_send_gdf():
     responses = send("pyt/INK01.D230601.T140100.P001", "UAT", "GDF")
     assert responses["login"] == "230 User logged in."
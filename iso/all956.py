@@ -4,13 +4,16 @@
 # Import modules from the Standard Library
 import datetime
 import random
+import re
+import hashlib
+import itertools
 
 
 # Global variables
 RAND_MAX6 = 0xF423F # Max value randgen can generate when limit is RAND_MAX6 (6 dgitis)
 RAND_MAX12 = 0xE8D4A50FFF # Max value randgen can generate when limit is RAND_MAX12 (12 digits)
-codes6 = {0} # Codes already used by randgen when limit is RAND_MAX6
-codes12 = {0} # Codes already used by randgen when limit is RAND_MAX12
+sequences = {} # Sequences used by randgen, one for each limit
+plans = {} # Default values and properties of the fields for each preset, compiled once and shared by all Fields instances
 
 
 class Network:
@@ -57,7 +60,8 @@ class Fields:
     def __init__(self):
 
         self.count = 129 # Number of fields. Note that DE000 is the message type
-        self.bitmap = ""
+        self.bitmap = 0 # Bits of the fields present in the message, DE001 being the most significant one
+        self.content = "" # Fields of the last message composed, from DE002 onwards
         self.val = [] # Field value
         self.present = {} # Defines if a field is supposed to be present for a given message type
         self.present["1100"] = []
@@ -340,8 +344,103 @@ class Fields:
             self.subfield_def_val["1421"][116].append("")
             self.subfield_dynamic[116].append(False)
 
-    def start(self):
-        """Sets the value of subclass objects, except for dynamic objects, which are set in the dynaset or inherit methods"""
+        # Fields with subfields, whose attributes can be changed by the message itself
+        self.substructured = [i for i in range(self.count) if self.subfield_count[i] != 1]
+        self.plan = None # Compiled defaults of the current preset, see compile_plan
+
+    def compose(self, row, fieldnames):
+        """Builds a raw ISO message from a template row, generating the values of the fields left empty"""
+
+        self.prepare(row)
+        return self.fill(row, fieldnames)
+
+    def prepare(self, row):
+        """Resets the fields for the message of a template row and assigns its preset"""
+
+        # Update Reversal Indicator
+        if row["Message Type"] in ["1420", "1421"] or re.match("^.*Reversal.*$", row["Preset"], re.IGNORECASE):
+            self.reversal_indicator = True
+            if row["Message Type"] == "":
+                row["Message Type"] = "1420"
+        else:
+            self.reversal_indicator = False
+
+        # Reset the fields and assign preset
+        self.start(row["Preset"])
+
+    def fill(self, row, fieldnames):
+        """Assigns the values of a prepared message from its template row and returns the raw ISO message"""
+
+        # Set message type
+        if row["Message Type"] != "":
+            self.val[0] = row["Message Type"]
+        else:
+            self.val[0] = self.def_val["Message Type"]
+
+        # Set default merchant name
+        if row["DE043 - Acceptor Name Location"] == "" and row["Scenario"] != "" and self.reversal_indicator is False:
+            row["DE043 - Acceptor Name Location"] = rf"{row['Scenario']}"
+
+        # Fields whose default value is the same for every message were already padded when compiling the plan
+        static = None
+        if self.reversal_indicator is False:
+            static = self.plan["static"].get(self.val[0])
+
+        # Assign values to fields
+        for i in range(3, self.count + 1):
+            field_n = i - 1
+
+            if row[fieldnames[i]] == "":
+                if static is not None and static[field_n] is not None:
+                    self.val[field_n] = static[field_n]
+                    self.update_bitmap(self.val[field_n])
+                    continue
+                self.set(self.val[0], field_n)
+            else:
+                if self.subfield_count[field_n] != 1:
+                    self.val[field_n] = self.check_substructure(row[fieldnames[i]], field_n)
+                else:
+                    self.val[field_n] = rf"{row[fieldnames[i]]}"
+
+            self.padding(field_n)
+
+            # Update bitmap
+            self.update_bitmap(self.val[field_n])
+
+        # Set bitmap
+        self.set(self.val[0], 1)
+
+        # Finalize message. The fields are kept apart from type and bitmap, to encode the message without splitting it again
+        self.content = "".join(self.val[2:])
+        return self.val[0] + self.val[1] + self.content
+
+    def parse(self, message):
+        """Splits a raw message into its field values, indexed by field number. Stops at the first malformed field"""
+
+        values = ["" for i in range(self.count)]
+        values[0] = message[0:4]
+        values[1] = message[4:36]
+        binbitmap = f"{int(values[1], 16):0128b}"
+        cursor = 36
+
+        for i in range(2, self.count):
+            if binbitmap[i - 1] == "1":
+                if self.var_len[i] == 0:
+                    next = cursor + self.len[i]
+                else:
+                    next = cursor + self.var_len[i]
+                    if not message[cursor:next].isdigit():
+                        break
+                    cursor, next = next, next + int(message[cursor:next])
+                if next > len(message):
+                    break
+                values[i] = message[cursor:next]
+                cursor = next
+
+        return values
+
+    def start(self, preset=""):
+        """Resets the fields for a new message, loading the default values and properties of its preset from a compiled plan"""
 
         # Preserve original data if needed
         if self.reversal_indicator is True:
@@ -351,27 +450,52 @@ class Fields:
                 else:
                     self.original_data[key] = self.val[key]
 
-        # Reset all attributes
-        for i in range(self.count):
-            self.val[i] = ""
-            self.present["1100"][i] = self.present["1120"][i] = self.present["1420"][i] = False
-            self.def_val["1100"][i] = self.def_val["1120"][i] = self.def_val["1420"][i] = ""
-            if self.subfield_count[i] != 1:
-                for j in range(self.subfield_count[i] + 1):
-                    self.subfield_present["1100"][i][j] = self.subfield_present["1120"][i][j] = self.subfield_present["1420"][i][j] = False
-                    self.subfield_def_val["1100"][i][j] = self.subfield_def_val["1120"][i][j] = self.subfield_def_val["1420"][i][j] = ""
-                    self.subfield_val[i][j] = ""
-
         # Update counters
         self.amount_counter += 1
 
-        # Define the default value and properties of each data element
+        if preset in plans:
+            self.plan = plans[preset]
+        else:
+            self.plan = compile_plan(preset)
+        plan = self.plan
+
+        # Reset all attributes. Only what the message can change is copied, the rest is shared with the plan
+        self.val = ["" for i in range(self.count)]
+        self.bitmap = 1
+        self.def_val["Message Type"] = plan["message_type"]
+        self.dynamic = plan["dynamic"]
+        self.subfield_dynamic = plan["subfield_dynamic"]
+        self.inheritance = plan["inheritance"]
+        for type in ["1100", "1120", "1420"]:
+            self.present[type] = plan["present"][type]
+            self.def_val[type] = list(plan["def_val"][type])
+            self.subfield_def_val[type] = plan["subfield_def_val"][type]
+            self.subfield_present[type] = list(plan["subfield_present"][type])
+            for i in self.substructured:
+                self.subfield_present[type][i] = list(self.subfield_present[type][i])
+        for i in self.substructured:
+            self.subfield_val[i] = ["" for j in self.subfield_val[i]]
+
+        # Repeat messages share the attributes of original messages
+        self.present["1121"], self.present["1421"] = self.present["1120"], self.present["1420"]
+        self.def_val["1121"], self.def_val["1421"] = self.def_val["1120"], self.def_val["1420"]
+        self.subfield_present["1121"], self.subfield_present["1421"] = self.subfield_present["1120"], self.subfield_present["1420"]
+        self.subfield_def_val["1121"], self.subfield_def_val["1421"] = self.subfield_def_val["1120"], self.subfield_def_val["1420"]
+
+        # Default values changing from one message to the next
+        self.def_val["1100"][12] = self.def_val["1120"][12] = self.def_val["1420"][12] = datetime.datetime.today().strftime("%y%m%d%H%M%S")
+        if preset == "Purchase DKK":
+            self.def_val["1100"][4] = self.def_val["1120"][4] = str(self.amount_counter * 7)
+            self.def_val["1100"][6] = self.def_val["1120"][6] = str(self.amount_counter)
+
+    def defaults(self):
+        """Sets the default value and properties of each data element, before any preset is applied. Only used by compile_plan"""
 
         # Field 0 - Message Type
         self.def_val["Message Type"] = "1100"
         # Field 1 - Bitmap
         self.present["1100"][1] = self.present["1120"][1] = self.present["1420"][1] = True
-        self.bitmap = "1"
+        self.bitmap = 1
         # Field 2 - PAN
         self.present["1100"][2] = self.present["1120"][2] = self.present["1420"][2] = True
         self.def_val["1100"][2] = self.def_val["1120"][2] = self.def_val["1420"][2] = "557383******9999"
@@ -670,10 +794,9 @@ class Fields:
 
             case "Purchase DKK":
 
+                # The amounts themselves change with every message, see start
                 self.inheritance.pop(6)
                 self.dynamic[4] = False
-                self.def_val["1100"][4] = self.def_val["1120"][4] = str(self.amount_counter * 7)
-                self.def_val["1100"][6] = self.def_val["1120"][6] = str(self.amount_counter)
                 self.subfield_present["1100"][63][9] = self.subfield_present["1120"][63][9] = True
                 self.subfield_dynamic[63][9] = True
 
@@ -990,45 +1113,127 @@ class Fields:
     def update_bitmap(self, value):
         """Builds the bitmap (DE001) of the ISO message"""
 
-        if value == "":
-            self.bitmap += "0"
-        else:
-            self.bitmap += "1"
+        self.bitmap = self.bitmap << 1 | (value != "")
 
     def iso_hex(self):
-        """Transforms the bitmap from binary to hexadecimal"""
-
-        # Initialize variables
-        cursor = 0
-        bitmap_len = len(self.bitmap)
-        hex_bitmap = ""
-
-        # Build hexadecimal bitmap
-        while cursor < bitmap_len:
+        """Transforms the bitmap to hexadecimal"""
+
+        return f"{self.bitmap:032X}"
+
+    def binary_bitmap(self):
+        """Transforms the bitmap to binary, as it is sent to the ISO Listener"""
+
+        return self.bitmap.to_bytes(16, "big")
+
+
+class Sequence:
+    """Hands out every integer from 1 to limit once, in a pseudo-random order, without keeping track of the ones already used.
+    A counter goes through a permutation of the range, a Feistel network whose round keys depend on the key and the business day.
+    Sequences with the same key split into shards hand out disjoint sets of integers, e.g. one for each process"""
+
+    def __init__(self, limit, key=None, shard=(0, 1)):
+
+        self.limit = limit
+        self.key = key if key is not None else random.getrandbits(64) # Sequences with the same key and limit hand out the same integers in the same order
+        self.half = (limit.bit_length() + 1) // 2 # Bits in each half of the Feistel network
+        self.mask = (1 << self.half) - 1
+        self.day = None # Business day the sequence started on, integers are only unique within it
+        self.cycle = 0 # Number of times every integer was handed out on the same day
+        self.rounds = []
+        self.counter = None
+        self.shard = shard # Index of this sequence among the ones sharing the key, and their number. It only takes every shard[1]-th position of the permutation
+
+    def start(self, day, cycle):
+        """Starts the sequence again, in an order of its own for the day and cycle"""
+
+        digest = hashlib.blake2b(f"{self.key}:{day}:{cycle}".encode("utf-8"), digest_size=32).digest()
+        self.rounds = [int.from_bytes(digest[i:i + 8], "big") for i in range(0, 32, 8)]
+        self.day = day
+        self.cycle = cycle
+        self.counter = itertools.count(self.shard[0], self.shard[1])
+
+    def permute(self, x):
+        """Maps an integer of 2 * self.half bits to another one, never mapping two integers to the same one"""
+
+        left, right = x >> self.half, x & self.mask
+        for key in self.rounds:
+            left, right = right, left ^ (((right ^ key) * 0x9E3779B97F4A7C15) >> 17 & self.mask)
+
+        return left << self.half | right
+
+    def next(self):
+        """Returns the next integer of the sequence"""
+
+        day = datetime.date.today()
+        if day != self.day:
+            self.start(day, 0)
+
+        n = next(self.counter)
+
+        # Every integer was handed out already: wrap around in a different order
+        if n >= self.limit:
+            self.start(day, self.cycle + 1)
+            n = next(self.counter)
+
+        # The permutation covers a power of 2, walk the cycle until getting back within the range
+        x = self.permute(n)
+        while x >= self.limit:
+            x = self.permute(x)
+
+        return x + 1
+
+
+def compile_plan(preset):
+    """Computes the default values and properties of the fields for a preset and stores them in plans, so that they are not rebuilt for every message"""
+
+    field = Fields()
+    field.defaults()
+    field.preset(preset)
+
+    plan = {
+        "message_type": field.def_val["Message Type"],
+        "dynamic": tuple(field.dynamic),
+        "subfield_dynamic": tuple(tuple(subfields) for subfields in field.subfield_dynamic),
+        "inheritance": field.inheritance,
+        "present": {},
+        "def_val": {},
+        "subfield_present": {},
+        "subfield_def_val": {},
+        "static": {} # Padded default values of the fields that don't depend on the message, None for the others
+    }
+    for type in ["1100", "1120", "1420"]:
+        plan["present"][type] = tuple(field.present[type])
+        plan["def_val"][type] = tuple(field.def_val[type])
+        plan["subfield_present"][type] = tuple(tuple(subfields) for subfields in field.subfield_present[type])
+        plan["subfield_def_val"][type] = tuple(tuple(subfields) for subfields in field.subfield_def_val[type])
+
+        # Timestamp and amounts are set again for every message by start
+        static = []
+        for i in range(field.count):
+            if field.present[type][i] is False:
+                static.append("")
+            elif field.dynamic[i] is True or i in field.inheritance or i in [4, 6, 12]:
+                static.append(None)
+            else:
+                field.val[i] = field.def_val[type][i]
+                field.padding(i)
+                static.append(field.val[i])
+        plan["static"][type] = tuple(static)
 
-            next = cursor + 4
-            hex_bitmap += hex(int(self.bitmap[cursor:next], 2))[2:].upper()
-            cursor = next
+    # Repeat messages share the attributes of original messages
+    plan["static"]["1121"], plan["static"]["1421"] = plan["static"]["1120"], plan["static"]["1420"]
 
-        return hex_bitmap
+    plans[preset] = plan
+    return plan
 
 
 def randgen(limit):
-    """Generates single use integers pseudo-randomly"""
-
-    random.seed()
-    x = 0
+    """Generates single use integers pseudo-randomly, from 1 to limit"""
 
-    if limit == RAND_MAX6:
-        while x in codes6:
-            x = random.randint(0, limit)
-        codes6.add(x)
-    elif limit == RAND_MAX12:
-        while x in codes12:
-            x = random.randint(0, limit)
-        codes12.add(x)
+    if limit not in sequences:
+        sequences[limit] = Sequence(limit)
 
-    return x
+    return sequences[limit].next()
 
 def esc(code):
     """Easily apply ANSI text color formatting"""
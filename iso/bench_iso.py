@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+"""Times the hot paths of the ISO simulator at several input sizes and saves the results as JSON.
+Results can be compared with the ones saved from another commit via --compare"""
+
+
+# Import from the Standard Library
+import sys
+import os
+import re
+import csv
+import json
+import time
+import datetime
+import platform
+import subprocess
+
+# Import from local directories
+import all956
+import decoder
+import framing
+import logwriter
+
+
+# Global variables
+sizes = [100, 1000, 10000] # Number of items each benchmark is run with
+repeat = 3 # Runs of each benchmark at each size, the fastest one is kept
+template = os.path.join(os.path.dirname(os.path.abspath(__file__)), "in", "t.csv")
+presets = ["", "Moneysend", "AFD PreAuth", "AFD Advice", "Withdrawal", "Refund", "Payment IQ", "Purchase With Cashback", "Purchase DKK", "Purchase MDES", "Purchase 3DS", "Advice Decline"]
+de063 = "0109MDU99999905010" # DE063 subfields, as tag id, tag length and tag value
+
+
+def main(benchmarks=None):
+    args = argparse()
+
+    results = run(benchmarks if benchmarks is not None else suite(), args["sizes"], args["repeat"], args["only"])
+
+    report = {
+        "commit": commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "repeat": args["repeat"],
+        "results": results
+    }
+    os.makedirs(os.path.dirname(args["out_filename"]) or ".", exist_ok=True)
+    with open(args["out_filename"], "w") as outfile:
+        json.dump(report, outfile, indent=4)
+    print(all956.esc("green") + args["out_filename"] + all956.esc("default") + " generated\n")
+
+    if args["compare_filename"]:
+        compare(results, args["compare_filename"])
+
+    sys.exit(0)
+
+
+def run(benchmarks, sizes, repeat, only=""):
+    """Runs each benchmark at each size, printing and returning the time of the fastest run"""
+    results = []
+
+    print(f"{'Benchmark':<40}{'Size':>8}{'Per item (us)':>16}{'Items/s':>12}")
+    for name, setup in benchmarks.items():
+        if only and not re.search(only, name):
+            continue
+        for size in sizes:
+            # Setup isn't timed, only the work done by the function it returns
+            work = setup(size)
+            best = None
+            for i in range(repeat):
+                start = time.perf_counter()
+                work()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            results.append({"benchmark": name, "size": size, "seconds": best, "per_item_us": best / size * 1e6, "items_per_second": size / best})
+            print(f"{name:<40}{size:>8}{best / size * 1e6:>16.2f}{size / best:>12.0f}")
+
+    print()
+    return results
+
+
+def compare(results, path):
+    """Prints how much faster or slower each benchmark got since the results saved in path"""
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    previous = {(result["benchmark"], result["size"]): result["per_item_us"] for result in baseline["results"]}
+
+    print(f"Compared with {path} (commit {baseline.get('commit') or 'unknown'})")
+    for result in results:
+        key = (result["benchmark"], result["size"])
+        if key not in previous:
+            continue
+        change = result["per_item_us"] / previous[key] - 1
+        color = "red" if change > 0.1 else "green" if change < -0.1 else "default"
+        print(f"{key[0]:<40}{key[1]:>8}" + all956.esc(color) + f"{change:>+16.1%}" + all956.esc("default"))
+    print()
+
+
+def commit():
+    """Returns the commit the benchmarks were run on, if the tree is a git repository"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def rows(preset=""):
+    """Returns the template's field names and a row with only the scenario and the preset, so that every field is generated"""
+    with open(template, encoding="utf-8-sig") as infile:
+        reader = csv.DictReader(infile)
+        row = {name: "" for name in reader.fieldnames}
+    row["Scenario"] = "Benchmark"
+    row["Preset"] = preset
+    return reader.fieldnames, row
+
+
+def messages(size):
+    """Composes size messages, going through every preset"""
+    field = all956.Fields()
+    templates = [rows(preset) for preset in presets]
+    result = []
+    for i in range(size):
+        fieldnames, row = templates[i % len(templates)]
+        result.append(field.compose(dict(row), fieldnames))
+    return result
+
+
+def compose(preset):
+    """Times Fields.compose for a preset"""
+    def setup(size):
+        field = all956.Fields()
+        fieldnames, row = rows(preset)
+        def work():
+            for i in range(size):
+                field.compose(dict(row), fieldnames)
+        return work
+    return setup
+
+
+def iso_hex(size):
+    """Times Fields.iso_hex on a composed message"""
+    field = all956.Fields()
+    fieldnames, row = rows()
+    field.compose(row, fieldnames)
+    def work():
+        for i in range(size):
+            field.iso_hex()
+    return work
+
+
+def check_substructure(size):
+    """Times Fields.check_substructure on a set of DE063 tags"""
+    field = all956.Fields()
+    fieldnames, row = rows()
+    field.compose(row, fieldnames)
+    def work():
+        for i in range(size):
+            field.check_substructure(de063, 63)
+    return work
+
+
+def encode(size):
+    """Times the conversion of messages to the binary form sent on the socket"""
+    batch = messages(size)
+    def work():
+        for message in batch:
+            framing.encode(message)
+    return work
+
+
+def parse(size):
+    """Times Fields.parse on messages of every preset"""
+    field = all956.Fields()
+    batch = messages(size)
+    def work():
+        for message in batch:
+            field.parse(message)
+    return work
+
+
+def decode(size):
+    """Times decoder.Message on messages of every preset, reading DE039 like the response path does"""
+    batch = messages(size)
+    def work():
+        for message in batch:
+            decoder.Message(message)[39]
+    return work
+
+
+def format(size):
+    """Times the conversion of messages to the human-readable form of the log"""
+    batch = messages(size)
+    def work():
+        for message in batch:
+            logwriter.text(message)
+    return work
+
+
+def suite():
+    """Returns the benchmarks of the ISO simulator, by name"""
+    benchmarks = {f"compose[{preset or 'Purchase'}]": compose(preset) for preset in presets}
+    benchmarks.update({
+        "iso_hex": iso_hex,
+        "check_substructure[DE063]": check_substructure,
+        "framing.encode": encode,
+        "Fields.parse": parse,
+        "decoder.Message": decode,
+        "format": format
+    })
+    return benchmarks
+
+
+def argparse():
+    """Parses arguments from the terminal"""
+    args = {
+        "sizes": sizes,
+        "repeat": repeat,
+        "only": "",
+        "out_filename": "out/bench_" + datetime.datetime.today().strftime("%y%m%d%H%M%S") + ".json",
+        "compare_filename": ""
+    }
+
+    if "--help" in sys.argv or "-h" in sys.argv:
+        print(f"Correct usage: ./{os.path.basename(sys.argv[0])} (--sizes=N,N,...) (--repeat=N) (--only=PATTERN) (--out=out/'results'.json) (--compare=out/'baseline'.json)")
+        sys.exit(1)
+
+    for arg in sys.argv[1:]:
+        if re.match("^--sizes=[0-9]+(,[0-9]+)*$", arg):
+            args["sizes"] = [max(int(size), 1) for size in arg[8:].split(",")]
+        elif re.match("^--repeat=[0-9]+$", arg):
+            args["repeat"] = max(int(arg[9:]), 1)
+        elif re.match("^--only=.+$", arg):
+            args["only"] = arg[7:]
+        elif re.match("^--out=.+$", arg):
+            args["out_filename"] = arg[6:]
+        elif re.match("^--compare=.+$", arg):
+            args["compare_filename"] = arg[10:]
+            if not os.path.exists(args["compare_filename"]):
+                print(f"{args['compare_filename']} not found")
+                sys.exit(1)
+        else:
+            print(f"{arg} is not a valid argument")
+            sys.exit(1)
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Decodes ISO 8583 messages in a single pass over their bitmap, materializing field values only when they are read"""
+
+
+# Import from local directories
+import all956
+import framing
+
+
+# Global variables
+field = all956.Fields()
+lengths = tuple(field.len) # Field lengths, by field number
+prefixes = tuple(field.var_len) # Number of digits declaring the length of variable length fields, 0 for fixed length fields
+responses = ["1110", "1130", "1430"] # Message types carrying an action code (DE039)
+
+
+class Message:
+    """Offset table of a raw message, either a string with a hexadecimal bitmap or a binary frame as read from the socket"""
+
+    def __init__(self, message):
+
+        if isinstance(message, str):
+            self.bitmap = int(message[4:36], 16)
+            start = 36
+            # Lengths count characters: ASCII messages can be sliced by byte, the others are kept as they are
+            data = message.encode("ascii") if message.isascii() else message
+        else:
+            self.bitmap = int.from_bytes(message[4:4 + framing.BITMAP_LEN], "big")
+            start = 4 + framing.BITMAP_LEN
+            data = bytes(message)
+            if not data[start:].isascii():
+                data = framing.decode(data)
+                start = 36
+
+        self.text_mode = isinstance(data, str) # Values are sliced from the string itself rather than from bytes
+        self.data = data if self.text_mode else memoryview(data)
+        self.type = data[0:4] if self.text_mode else data[0:4].decode("ascii")
+        self.offsets = {} # Start and end of each field found, by field number
+        self.complete = True # False when the message stops at a malformed or truncated field
+        self.scan(data, start)
+
+    def scan(self, data, cursor):
+        """Records where each field of the bitmap starts and ends, stopping at the first malformed field like Fields.parse"""
+
+        offsets = self.offsets
+        size = len(data)
+        bits = self.bitmap & (1 << 127) - 1 # DE001 only announces the secondary bitmap
+
+        # Walk the set bits only, from DE002 onwards
+        while bits:
+            top = bits.bit_length()
+            bits ^= 1 << top - 1
+            n = 129 - top
+
+            prefix = prefixes[n]
+            if prefix == 0:
+                end = cursor + lengths[n]
+            else:
+                digits = data[cursor:cursor + prefix]
+                if len(digits) != prefix or not digits.isdigit():
+                    self.complete = False
+                    break
+                cursor += prefix
+                end = cursor + int(digits)
+
+            if end > size:
+                self.complete = False
+                break
+            offsets[n] = (cursor, end)
+            cursor = end
+
+    def __contains__(self, n):
+        return n in (0, 1) or n in self.offsets
+
+    def __getitem__(self, n):
+        """Returns the value of a field, without its length prefix. Absent fields are empty strings"""
+
+        if n == 0:
+            return self.type
+        if n == 1:
+            return f"{self.bitmap:032X}"
+        if n not in self.offsets:
+            return ""
+
+        start, end = self.offsets[n]
+        if self.text_mode:
+            return self.data[start:end]
+        return str(self.data[start:end], "ascii")
+
+    def fields(self):
+        """Returns the numbers of the fields found, in order"""
+        return [0, 1] + list(self.offsets)
+
+    def values(self):
+        """Returns every field value indexed by field number, in the same form as Fields.parse"""
+        values = ["" for i in range(field.count)]
+        for n in self.fields():
+            values[n] = self[n]
+        return values
+
+    def code(self):
+        """Returns the action code (DE039) of responses, an empty string for the other messages"""
+        return self[39] if self.type in responses else ""
+
+    def text(self):
+        """Returns the message in the human-readable format used in the logs"""
+        text = f"<MSG-{self.type}>\n"
+        for n in self.fields()[1:]:
+            text += f"    {n:03d}<{self[n]}>\n"
+        return text + "\n"
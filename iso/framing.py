@@ -0,0 +1,140 @@
+"""Splits the byte stream exchanged with the ISO Listener into single ISO 8583 messages"""
+
+
+# Import from the Standard Library
+import collections
+
+
+# Global variables
+PREFIX_LEN = 4 # Every message is preceded by its length in bytes, as 4 ASCII digits
+BITMAP_LEN = 16 # Primary and secondary bitmap, in binary form
+
+
+class Framer:
+    """Reassembles length-prefixed messages from the chunks read from a TCP/IP socket"""
+
+    def __init__(self, size=4096):
+
+        self.buffer = bytearray(size) # Receive buffer, reused across reads
+        self.view = memoryview(self.buffer)
+        self.start = 0 # Position of the first byte not yet handed back as part of a message
+        self.end = 0 # Position right after the last byte received
+        self.ready = collections.deque() # Complete messages not yet handed back
+
+    def feed(self, data):
+        """Appends a chunk of data to the buffer and returns the messages completed by it"""
+
+        self.reserve(len(data))
+        self.view[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+        return self.frames()
+
+    def frames(self):
+        """Returns the complete messages found in the buffer, without their length prefix"""
+
+        result = []
+
+        while self.end - self.start >= PREFIX_LEN:
+
+            prefix = bytes(self.view[self.start:self.start + PREFIX_LEN])
+            if not prefix.isdigit():
+                raise ValueError(f"Invalid length prefix {prefix}")
+            next = self.start + PREFIX_LEN + int(prefix)
+
+            # The rest of the message is still on its way
+            if next > self.end:
+                self.reserve(next - self.end)
+                break
+
+            result.append(bytes(self.view[self.start + PREFIX_LEN:next]))
+            self.start = next
+
+        # Nothing left over, start again from the beginning of the buffer
+        if self.start == self.end:
+            self.start = self.end = 0
+
+        return result
+
+    def reserve(self, size):
+        """Makes sure there are at least size free bytes at the end of the buffer"""
+
+        if len(self.buffer) - self.end >= size:
+            return
+
+        # Move the incomplete message at the beginning of the buffer
+        pending = self.end - self.start
+        self.buffer[0:pending] = self.buffer[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+        # Grow the buffer if the message still doesn't fit
+        if len(self.buffer) - self.end < size:
+            self.view.release()
+            self.buffer.extend(bytes(max(size - (len(self.buffer) - self.end), len(self.buffer))))
+            self.view = memoryview(self.buffer)
+
+    def read(self, tcp_socket):
+        """Returns the next message received on a blocking socket, reading as many times as needed"""
+
+        while not self.ready:
+
+            # Read straight into the free space of the buffer
+            self.reserve(1)
+            size = tcp_socket.recv_into(self.view[self.end:])
+            if size == 0:
+                raise ConnectionError("The ISO Listener closed the connection")
+            self.end += size
+            self.ready.extend(self.frames())
+
+        return self.ready.popleft()
+
+
+class Encoder:
+    """Writes length-prefixed messages straight into a buffer reused from one message to the next"""
+
+    def __init__(self, size=4096):
+
+        self.buffer = bytearray(size) # Send buffer, reused across messages
+        self.view = memoryview(self.buffer)
+
+    def encode(self, msg_type, bitmap, content):
+        """Writes a message from its type, its binary bitmap and its fields, length prefixes included.
+        Returns a view of the buffer, only valid until the next message is encoded"""
+
+        # The fields are encoded all at once, which is much faster than one by one
+        data = content.encode("utf-8")
+        size = len(msg_type) + len(bitmap) + len(data)
+        end = PREFIX_LEN + size
+
+        if len(self.buffer) < end:
+            self.view.release()
+            self.buffer.extend(bytes(end - len(self.buffer)))
+            self.view = memoryview(self.buffer)
+
+        self.view[0:PREFIX_LEN] = f"{size:04d}".encode("utf-8")
+        cursor = PREFIX_LEN + len(msg_type)
+        self.view[PREFIX_LEN:cursor] = msg_type.encode("utf-8")
+        self.view[cursor:cursor + len(bitmap)] = bitmap
+        cursor += len(bitmap)
+        self.view[cursor:end] = data
+
+        return self.view[0:end]
+
+
+def encode(message):
+    """Converts a raw message to binary, prefixed by its length"""
+
+    binary = message[0:4].encode("utf-8") + bytes.fromhex(message[4:4 + BITMAP_LEN * 2]) + message[4 + BITMAP_LEN * 2:].encode("utf-8")
+
+    return f"{len(binary):04d}".encode("utf-8") + binary
+
+
+def decode(frame):
+    """Converts a binary message to its raw string form, with the bitmap in hexadecimal"""
+
+    msg_type = frame[0:4].decode("utf-8")
+    bitmap = frame[4:4 + BITMAP_LEN].hex().upper()
+    content = frame[4 + BITMAP_LEN:].decode("utf-8")
+
+    return msg_type + bitmap + content
@@ -12,17 +12,47 @@ import datetime
 import time
 import socket
 import os
+import collections
+import asyncio
+import threading
+import queue
 
 # Import from local directories
 import all956
+import decoder
+import framing
+import logwriter
+import session
+import rate
+import stats
+import metrics
 
 
 # Global variables
+address = ("10.110.50.147", 462) # Temenos ISO Listener
 field = all956.Fields()
 logfile = None
 message_count = 0
 tcp_socket = None
+encoder = framing.Encoder()
+timeout = 3 # Seconds to wait for the ISO Listener before giving up
 timeout_message = "Timeout"
+echo_interval = 10 # Seconds the connection can stay idle before an echo message is sent
+echo_failures = 2 # Number of echo messages in a row left unanswered before the connection is re-established
+reconnect_delay = 30 # Maximum number of seconds between two attempts to reconnect
+echoes = {} # Network management messages sent by the heartbeat thread and awaiting a response, keyed by STAN
+responses = queue.Queue() # Responses to the main thread's messages, queued by the reader thread as they arrive
+last_activity = 0 # When something was last received from the ISO Listener. Sending doesn't count, since a listener may accept messages without answering them
+socket_lock = threading.Lock() # Lets the heartbeat thread write to the socket along with the main thread
+heartbeat_stop = threading.Event()
+window = 1 # Maximum number of requests awaiting a response at the same time
+in_flight = {} # Requests awaiting a response, keyed by STAN (DE011) and RRN (DE037)
+pending = collections.deque() # Output rows in submission order, written as soon as they are complete
+bucket = None # Paces the messages sent to the ISO Listener
+timers = stats.Stats() # Time spent in each stage of the run
+stop_metrics = None # Stops rewriting the metrics file, when there is one
+submitted = {} # When each request in flight was written to the socket, with the same keys as in_flight
+waiting = 0 # 1 while send waits for a response, which is the only request in flight when not pipelining
 
 
 def main():
@@ -33,12 +63,13 @@ def main():
     global message_count
     global logfile
     global field
+    global bucket
 
     # Open files
     infile = open(args["in_filename"], encoding="utf-8-sig")
     outfile = open(args["out_filename"], "w")
-    if args["logs"] is True:
-        logfile = open(args["log_filename"], "a")
+    if args["logs"] is True and args["sessions"] == 0:
+        logfile = logwriter.Writer(args["log_filename"], args["flush"])
 
     reader = csv.DictReader(infile)
     if len(reader.fieldnames) != 131:
@@ -48,77 +79,87 @@ def main():
     writer = csv.DictWriter(outfile, fieldnames=fieldnames)
     writer.writeheader()
 
+    # Pace the messages
+    if args["transfer"] is True and args["tps"] > 0:
+        total = None
+        if args["ramp_down"] > 0:
+            with open(args["in_filename"], encoding="utf-8-sig") as counter:
+                total = sum(1 for row in csv.DictReader(counter))
+        bucket = rate.Bucket(args["tps"], args["burst"], args["ramp_up"], args["ramp_down"], total)
+
+    # Expose the progress of the run
+    if args["metrics"]:
+        expose(args["metrics"])
+
+    # Drive concurrent sessions on an event loop instead
+    if args["sessions"] > 0:
+        run_sessions(args, reader, writer)
+        infile.close()
+        outfile.close()
+        print(all956.esc("green") + args["out_filename"] + all956.esc("default") + " generated\n")
+        report(args)
+        sys.exit(0)
+
+    if args["transfer"] is True:
+        maintain_connection()
+
+    # The run is timed from the first message
+    timers.start()
+
     for row in reader:
         # Update/reset variables
         message_count += 1
         response_code = ""
 
-        # Update Reversal Indicator
-        if row["Message Type"] in ["1420", "1421"] or re.match("^.*Reversal.*$", row["Preset"], re.IGNORECASE):
-            field.reversal_indicator = True
-            if row["Message Type"] == "":
-                row["Message Type"] = "1420"
-        else:
-            field.reversal_indicator = False
-
-        field.start()
-        message = ""
-
-        # Assign preset
-        field.preset(row["Preset"])
-
-        # Set message type
-        if row["Message Type"] != "":
-            field.val[0] = row["Message Type"]
-        else:
-            field.val[0] = field.def_val["Message Type"]
-
-        # Set default merchant name
-        if row["DE043 - Acceptor Name Location"] == "" and row["Scenario"] != "" and field.reversal_indicator is False:
-            row["DE043 - Acceptor Name Location"] = rf"{row['Scenario']}"
-
-        # Assign values to fields
-        for i in range(3, field.count + 1):
-            field_n = i - 1
-
-            if row[reader.fieldnames[i]] == "":
-                field.set(field.val[0], field_n)
-            else:
-                if field.subfield_count[field_n] != 1:
-                    field.val[field_n] = field.check_substructure(row[reader.fieldnames[i]], field_n)
-                else:
-                    field.val[field_n] = rf"{row[reader.fieldnames[i]]}"
-
-            field.padding(field_n)
-
-            # Update message and bitmap
-            field.update_bitmap(field.val[field_n])
-            message += field.val[field_n]
-
-        # Set bitmap
-        field.set(field.val[0], 1)
-
-        # Finalize message
-        message = field.val[0] + field.val[1] + message
+        # Resetting the fields is timed apart from filling them
+        begin = time.perf_counter_ns()
+        field.prepare(row)
+        lap = lapse("start", begin)
+        message = field.fill(row, reader.fieldnames)
+        lap = lapse("fill", lap)
 
         if args["logs"] is True:
             format(message)
+            lap = lapse("log", lap)
+
+        output = {"Scenario": row["Scenario"], "ISO Request": message, "ISO Response": "", "Response Code": response_code}
+
+        # Wait for the rate control to release the message
+        if bucket is not None:
+            bucket.wait()
+            lap = lapse("wait", lap)
 
         # Send message to ISO Listener
         if args["transfer"] is True:
-            response = send(message)
+            request = encoder.encode(field.val[0], field.binary_bitmap(), field.content)
+            lap = lapse("encode", lap)
+        if args["transfer"] is True and window > 1:
+            output["ISO Response"] = None
+            submit(message, output, request)
+            lap = lapse("submit", lap)
+        elif args["transfer"] is True:
+            output["ISO Response"] = send(message, request)
+            lap = lapse("round trip", lap)
             if args["logs"] is True:
-                response_code = format(response)
-        else:
-            response = ""
+                output["Response Code"] = format(output["ISO Response"])
+                lap = lapse("log", lap)
 
         # Update the outfile
-        writer.writerow({"Scenario": row["Scenario"], "ISO Request": message, "ISO Response": response, "Response Code": response_code})
+        pending.append(output)
+        flush(writer)
+        timers.add("message", time.perf_counter_ns() - begin)
+        timers.messages += 1
+
+    # Wait for the responses still in flight
+    if args["transfer"] is True and window > 1:
+        drain()
+        flush(writer)
 
     # Close files and sockets
     infile.close()
     outfile.close()
     if args["transfer"] is True:
+        heartbeat_stop.set()
         send(network.get("signoff"))
         print("Closing socket\n")
         tcp_socket.close()
@@ -128,9 +169,74 @@ def main():
         logfile.close()
 
     print()
+    report(args)
     sys.exit(0)
 
 
+def lapse(stage, since):
+    """Records the time elapsed since a previous lap as spent in a stage. Returns the time of this lap"""
+
+    now = time.perf_counter_ns()
+    timers.add(stage, now - since)
+    return now
+
+
+def expose(target):
+    """Serves the metrics of the run on a local port, or rewrites them in a file every few seconds"""
+
+    global stop_metrics
+
+    metrics.collector.timers = timers
+    metrics.collector.in_flight = lambda: len(in_flight) + waiting
+
+    if target.isdigit():
+        try:
+            metrics.collector.serve(int(target))
+        except OSError as error:
+            print(f"Can't serve the metrics on port {target}: {error.strerror}")
+            sys.exit(1)
+        print(f"Metrics served on http://127.0.0.1:{target}/metrics\n")
+    else:
+        stop_metrics = metrics.collector.write(target)
+
+
+def report(args):
+    """Prints how long each stage of the run took, and saves it next to the outfile if requested"""
+
+    timers.stop()
+    print(timers.summary())
+    if stop_metrics is not None:
+        stop_metrics()
+        print(all956.esc("green") + args["metrics"] + all956.esc("default") + " generated\n")
+    if args["stats"] is True:
+        timers.save(args["stats_filename"])
+        print(all956.esc("green") + args["stats_filename"] + all956.esc("default") + " generated\n")
+
+
+def run_sessions(args, reader, writer):
+    """Spreads the messages over concurrent sessions, each with its own connection and log file"""
+
+    logfiles = None
+    if args["logs"] is True:
+        logfiles = [logwriter.Writer(f"{args['log_filename'][:-4]}_{i + 1}.txt", args["flush"]) for i in range(args["sessions"])]
+
+    print(f"Opening {args['sessions']} sessions\n")
+    timers.start()
+    try:
+        outputs = asyncio.run(session.run(address, list(reader), reader.fieldnames, args["sessions"], args["connections"], window, logfiles, bucket, timers))
+    except (ConnectionError, TimeoutError):
+        print("Can't establish a connection")
+        sys.exit(2)
+    print("Sessions closed\n")
+
+    writer.writerows(outputs)
+
+    if logfiles is not None:
+        for sink in logfiles:
+            print(all956.esc("green") + sink.name + all956.esc("default") + " generated")
+            sink.close()
+
+
 def argparse():
     """Parses arguments from the terminal"""
 
@@ -140,18 +246,31 @@ def argparse():
         "out_filename": "",
         "log_filename": "",
         "transfer": False,
-        "logs": True
+        "sessions": 0,
+        "connections": 0,
+        "tps": None,
+        "burst": 1,
+        "ramp_up": 0,
+        "ramp_down": 0,
+        "logs": True,
+        "flush": None,
+        "stats": False,
+        "stats_filename": "",
+        "metrics": ""
     }
+    global address
     global tcp_socket
     global network
+    global window
+    global echo_interval
     docker = False
     iso_path = "/Cards/iso"
     out_path = ""
     logs_path = ""
 
     # Check correct usage
-    if not 2 <= len(sys.argv) <= 5 or "--help" in sys.argv or "-h" in sys.argv:
-        print("Correct usage: ./iso.py in/'input_file'.csv (out/'output_file'.csv) ([--send, -s]) (--nologs)")
+    if not 2 <= len(sys.argv) <= 16 or "--help" in sys.argv or "-h" in sys.argv:
+        print("Correct usage: ./iso.py in/'input_file'.csv (out/'output_file'.csv) ([--send, -s]) (--host=ADDR:PORT) (--window=N) (--sessions=N) (--connections=N) (--tps=N) (--burst=N) (--ramp=UP(:DOWN)) (--echo=SECONDS) (--flush=SECONDS) (--stats) (--metrics=PORT|PATH) (--nologs)")
         sys.exit(1)
 
     # Create out folder if it doesn't exist
@@ -177,27 +296,78 @@ def argparse():
             if not re.match("^.*.csv$", args["out_filename"]):
                 args["out_filename"] += ".csv"
         elif arg in ["--send", "-s"]:
-            # Setup TCP/IP connection
             args["transfer"] = True
-            socket.setdefaulttimeout(3)
-            network = all956.Network()
-            print("Opening socket\n")
-            try:
-                tcp_socket = socket.create_connection(('10.110.50.147', 462))
-            except TimeoutError:
-                raise TimeoutError("Not able to establish a connection with Temenos, make sure you are connected to Flowe VPN")
+        elif re.match("^--host=[^:]+:[0-9]+$", arg):
+            host, port = arg[7:].rsplit(":", 1)
+            address = (host, int(port))
+        elif re.match("^--window=[0-9]+$", arg):
+            window = int(arg[9:])
+            if window < 1:
+                print("The window must allow at least 1 request in flight")
+                sys.exit(1)
+        elif re.match("^--sessions=[0-9]+$", arg):
+            args["sessions"] = int(arg[11:])
+        elif re.match("^--connections=[0-9]+$", arg):
+            args["connections"] = int(arg[14:])
+        elif re.match("^--echo=[0-9]+$", arg):
+            echo_interval = max(int(arg[7:]), 1)
+            session.echo_interval = echo_interval
+        elif re.match("^--tps=[0-9]+([.][0-9]+)?$", arg):
+            args["tps"] = float(arg[6:])
+        elif re.match("^--burst=[0-9]+$", arg):
+            args["burst"] = max(int(arg[8:]), 1)
+        elif re.match("^--ramp=[0-9]+([.][0-9]+)?(:[0-9]+([.][0-9]+)?)?$", arg):
+            ramp = arg[7:].split(":")
+            args["ramp_up"] = float(ramp[0])
+            if len(ramp) == 2:
+                args["ramp_down"] = float(ramp[1])
+        elif re.match("^--flush=[0-9]+([.][0-9]+)?$", arg):
+            args["flush"] = float(arg[8:])
+            if args["flush"] <= 0:
+                print("The flush interval must be greater than 0 seconds")
+                sys.exit(1)
+        elif re.match("^--metrics=.+$", arg):
+            args["metrics"] = arg[10:]
+        elif arg == "--stats":
+            args["stats"] = True
         elif arg == "--nologs":
             args["logs"] = False
         else:
             print(f"{arg} is not a valid argument")
             sys.exit(1)
 
+    if (args["sessions"] > 0 or args["connections"] > 0) and args["transfer"] is False:
+        print("Sessions and connections can only be used together with --send")
+        sys.exit(1)
+
+    # A pool of connections is driven by at least one session
+    if args["connections"] > 0 and args["sessions"] == 0:
+        args["sessions"] = 1
+
+    # Unless told otherwise, one message at a time is sent every 2 seconds, while pipelines and sessions are not paced
+    if args["tps"] is None:
+        if window == 1 and args["sessions"] == 0:
+            args["tps"] = 0.5
+        else:
+            args["tps"] = 0
+
+    # Setup TCP/IP connection
+    if args["transfer"] is True and args["sessions"] == 0:
+        socket.setdefaulttimeout(timeout)
+        network = all956.Network()
+        print("Opening socket\n")
+        try:
+            tcp_socket = socket.create_connection(address)
+        except TimeoutError:
+            raise TimeoutError("Not able to establish a connection with Temenos, make sure you are connected to Flowe VPN")
+
     if args["in_filename"] == "":
         print("Input file not specified. Type in/'filename'.csv to choose an input file")
         sys.exit(1)
 
     if args["out_filename"] == "":
         args["out_filename"] = "out/" + args["in_filename"][3:]
+    args["stats_filename"] = args["out_filename"][:-4] + "_stats.json"
 
     if args["logs"] is True:    
         # Create logs path if it doesn't exist
@@ -215,132 +385,283 @@ def argparse():
 
 
 def maintain_connection():
-    """Defines when ISO 8583 network management messages need to be sent"""
+    """Starts reading from the socket and signs on, then starts the heartbeat, which keeps the connection alive with ISO 8583 network management messages"""
 
-    global message_count
-    global timeout_message
+    threading.Thread(target=listen, name="Reader", daemon=True).start()
+
+    response = send(network.get("signon"))
+    if response == timeout_message:
+        print("Can't establish a connection")
+        print("Closing socket\n")
+        tcp_socket.close()
+        sys.exit(2)
 
-    if message_count == 1:
+    threading.Thread(target=heartbeat, name="Heartbeat", daemon=True).start()
 
-        response = send(network.get("signon"))
-        if response == timeout_message:
-            print("Can't establish a connection")
-            print("Closing socket\n")
-            tcp_socket.close()
-            sys.exit(2)
 
-    elif (message_count / 5.0).is_integer():
+def heartbeat():
+    """Sends an echo message whenever nothing has been received for echo_interval seconds, and re-establishes the connection
+    once echo_failures of them in a row go unanswered. Runs on a background thread"""
 
-        response = send(network.get("echo"))
-        if response == timeout_message:
-            print("Echo timeout")
+    failures = 0
 
+    while not heartbeat_stop.wait(min(echo_interval, 1)):
 
-def send(message):
-    """Sends messages to the ISO Listener via TCP/IP"""
+        if time.monotonic() - last_activity < echo_interval:
+            continue
+
+        # The main thread doesn't have to wait for the echo response
+        elapsed = exchange(network.get("echo"))
+        if elapsed is not None:
+            metrics.collector.echo.record(elapsed)
+            failures = 0
+            continue
+
+        failures += 1
+        print("Echo timeout")
+        if failures >= echo_failures:
+            reconnect()
+            failures = 0
+
+
+def exchange(message):
+    """Sends a network management message from the heartbeat thread and waits for the reader thread to hand back its response.
+    Returns the round trip in nanoseconds, or None if the message went unanswered"""
+
+    # DE011 comes right after the bitmap
+    stan = message[36:42]
+    echo = echoes[stan] = {"sent": time.perf_counter_ns(), "received": None, "answered": threading.Event()}
+    try:
+        transmit(message)
+    except OSError:
+        print("Echo failed")
+
+    answered = echo["answered"].wait(timeout)
+    echoes.pop(stan, None)
+    return echo["received"] - echo["sent"] if answered else None
+
+
+def reconnect():
+    """Replaces a connection that stopped answering with a new one, and signs on again. Runs on the heartbeat thread"""
+
+    global tcp_socket
+
+    print("Reconnecting\n")
+    # Shutting the socket down wakes the reader thread up, which waits for the new one
+    try:
+        tcp_socket.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    tcp_socket.close()
+
+    delay = 1
+    while not heartbeat_stop.is_set():
+        try:
+            connection = socket.create_connection(address)
+        except OSError:
+            connection = None
+
+        if connection is not None:
+            with socket_lock:
+                tcp_socket = connection
+            if exchange(network.get("signon")) is not None:
+                metrics.collector.reconnects += 1
+                print("Connection re-established\n")
+                return
+            connection.close()
+
+        heartbeat_stop.wait(delay)
+        delay = min(delay * 2, reconnect_delay)
+
+
+def listen():
+    """Reads the messages from the socket as soon as they arrive, on a background thread. The responses to the heartbeat's messages
+    are handed back to it, timed on arrival, while the others are queued for receive"""
+
+    global last_activity
+
+    while not heartbeat_stop.is_set():
+        connection = tcp_socket
+        framer = framing.Framer()
+        try:
+            while True:
+                try:
+                    binary = framer.read(connection)
+                except TimeoutError:
+                    continue
+                except ValueError as error:
+                    # The length prefixes can't be trusted anymore: start again from whatever arrives next
+                    print(f"{error}, discarding the data received so far\n")
+                    framer = framing.Framer()
+                    continue
+                received = time.perf_counter_ns()
+                last_activity = time.monotonic()
+
+                # A message that can't be decoded is skipped, the connection itself is fine
+                try:
+                    value = framing.decode(binary)
+                    decoded = decoder.Message(binary)
+                except ValueError:
+                    print(f"Response ({len(binary)} bytes long) can't be decoded: {binary}\n")
+                    continue
+                print(f"Response ({len(binary)} bytes long): {value}\n")
+
+                if decoded[0] in decoder.responses:
+                    metrics.collector.count_response(decoded[39])
+                echo = echoes.pop(decoded[11], None)
+                if echo is not None:
+                    echo["received"] = received
+                    echo["answered"].set()
+                else:
+                    responses.put(value)
+        except OSError:
+            # Nothing more comes from this socket: wait until the heartbeat replaces it, unless the run is over
+            while connection is tcp_socket and not heartbeat_stop.wait(0.1):
+                pass
+
+
+def send(message, request=None):
+    """Sends messages to the ISO Listener via TCP/IP and waits for the response with the same STAN (DE011) and RRN (DE037)"""
 
     global message_count
     global timeout_message
+    global waiting
 
-    if message[0:4] != network.mti:
-        maintain_connection()
-
-    # Convert the message to binary
-    request = {}
-    request["value"] = message
-    request["msg_type"] = request["value"][0:4]
-    request["bitmap"] = request["value"][4:36]
-    request["content"] = request["value"][36:]
-    request["binary"] = request["msg_type"].encode("utf-8") + bytes.fromhex(request["bitmap"]) + request["content"].encode("utf-8")
-    request["len"] = str(f"{len(request['binary']):04d}")
-    request["binary"] = request["len"].encode("utf-8") + request["binary"]
+    decoded = decoder.Message(message)
+    deadline = time.monotonic() + timeout
 
+    waiting = 1
     try:
-        # Send message
-        feedback = tcp_socket.sendall(request["binary"])
-        if feedback == None:
-            print(f"Request ({str(int(request['len']))} bytes long): {request['value']} ")
-            response = {}
-            response["binary"] = tcp_socket.recv(1024)
-    except TimeoutError:
+        transmit(message, request)
+        while True:
+            response = receive(max(deadline - time.monotonic(), 0))
+
+            # Late responses to messages that already timed out are dropped. Some responses don't echo DE037 back
+            answer = decoder.Message(response)
+            if answer[11] == decoded[11] and answer[37] in (decoded[37], ""):
+                return response
+            print(f"No request in flight matches response {response}\n")
+    except OSError:
+        metrics.collector.timeouts += 1
         if message[0:4] != network.mti:
             print(f"Message n. {message_count} timed out\n")
         return f"{timeout_message}"
+    finally:
+        waiting = 0
+
+
+def submit(message, output, request=None):
+    """Sends messages to the ISO Listener without waiting for the response, keeping at most window requests in flight"""
+
+    # Make room in the window
+    while len(in_flight) >= window:
+        collect()
+
+    # Register the request before it hits the wire, so that its response can always be matched
+    decoded = decoder.Message(message)
+    key = (decoded[11], decoded[37])
+    in_flight[key] = output
+    submitted[key] = time.perf_counter_ns()
+
+    try:
+        transmit(message, request)
+    except OSError:
+        expire(key)
+
+
+def collect():
+    """Receives one response and assigns it to the request in flight with the same STAN (DE011) and RRN (DE037).
+    Waits no longer than the oldest request in flight has left, and gives up on the requests waiting for longer than timeout"""
 
-    # Format response
-    response["len"] = response["binary"][0:4].decode("utf-8")
-    response["msg_type"] = response["binary"][4:8].decode("utf-8")
-    response["bitmap"] = response["binary"][8:24].hex().upper()
-    response["content"] = response["binary"][24:].decode("utf-8")
-    response["value"] = response["msg_type"] + response["bitmap"] + response["content"]
-    print(f"Response ({str(int(response['len']))} bytes long): {response['value']}\n")
+    # Every request gets timeout seconds, however many responses arrive in the meantime
+    left = timeout - (time.perf_counter_ns() - min(submitted.values())) / 1e9 if submitted else timeout
+    try:
+        response = receive(max(left, 0))
+    except TimeoutError:
+        expire()
+        return False
+
+    decoded = decoder.Message(response)
+    key = (decoded[11], decoded[37])
+
+    # Some responses don't echo DE037 back: fall back on the STAN alone
+    if key not in in_flight:
+        key = next((pending_key for pending_key in in_flight if pending_key[0] == decoded[11]), None)
+    if key is None:
+        print(f"No request in flight matches response {response}\n")
+    else:
+        output = in_flight.pop(key)
+        output["ISO Response"] = response
+        timers.add("round trip", time.perf_counter_ns() - submitted.pop(key))
+        if logfile is not None:
+            output["Response Code"] = format(response)
+
+    expire()
+    return True
+
+
+def expire(key=None):
+    """Gives up on the requests in flight waiting for longer than timeout (or on a specific one) and marks them as timed out"""
+
+    if key is not None:
+        keys = [key]
+    else:
+        deadline = time.perf_counter_ns() - timeout * 1e9
+        keys = [key for key, sent in submitted.items() if sent <= deadline]
+
+    for key in keys:
+        output = in_flight.pop(key)
+        submitted.pop(key, None)
+        metrics.collector.timeouts += 1
+        print(f"Message with STAN {key[0]} timed out\n")
+        output["ISO Response"] = timeout_message
+
+
+def drain():
+    """Waits for all the requests in flight. Whatever is still missing after a timeout is considered lost"""
+
+    while in_flight:
+        collect()
 
-    time.sleep(2)
-    return response["value"]
+
+def flush(writer):
+    """Writes to the outfile the completed rows, preserving the order of the input file"""
+
+    while pending and pending[0]["ISO Response"] is not None:
+        writer.writerow(pending.popleft())
+
+
+def transmit(message, request=None):
+    """Writes a message to the TCP/IP socket, converting it to binary unless its binary form is passed as well"""
+
+    if request is None:
+        request = framing.encode(message)
+    with socket_lock:
+        tcp_socket.sendall(request)
+    metrics.collector.count_sent(message[0:4])
+    print(f"Request ({len(request) - framing.PREFIX_LEN} bytes long): {message} ")
+
+
+def receive(wait=timeout):
+    """Returns the next response to a message of the main thread, as queued by the reader thread, waiting at most wait seconds"""
+
+    try:
+        return responses.get(timeout=wait)
+    except queue.Empty:
+        raise TimeoutError("The ISO Listener didn't respond in time")
 
 
 def format(message):
-    """Format raw messages to make them human-readable"""
+    """Queues raw messages for the log, where they are made human-readable. Returns DE039 for responses"""
 
     # Initialize variables
     global logfile
-    global timeout_message
-    global field
-    cursor = temp_cursor = next = 0
-    binbitmap_len = 128
-    hexbitmap_len = 32
-    values = ["" for i in range(field.count)]
 
-    if message[0:4] not in field.present.keys():
-        logfile.write(f"{message}\n\n")
-        return
+    # Formatting and writing happen on the log writer's thread
+    logfile.write(message)
 
-    # Print Message Type
-    next += field.len[0]
-    message_type = message[cursor:next]
-    logfile.write(f"<MSG-{message_type}>\n")
-    cursor = next
-    field.present[message_type][0] = True
-
-    # Get hexadecimal bitmap
-    next += hexbitmap_len
-    hexbitmap = message[cursor:next]
-    # Print hexadecimal bitmap
-    logfile.write(f"    001<{hexbitmap}>\n")
-    field.present[message_type][1] = True
-    cursor = next
-
-    # Convert bitmap to binary
-    binbitmap = bin(int(hexbitmap, 16))[2:]
-
-    # Take note of present fields
-    for i in range(1, binbitmap_len):
-        if binbitmap[i] == "1":
-            field.present[message_type][i + 1] = True
-        else:
-            field.present[message_type][i + 1] = False
-
-    # Print each field
-    for i in range(2, binbitmap_len):
-        if field.present[message_type][i]:
-            # Check field length
-            if field.var_len[i] == 0:
-                next += field.len[i]
-            else:
-                next += field.var_len[i]
-                temp_cursor = next
-                next += int(message[cursor:next])
-                cursor = temp_cursor
-            # Extract field from string and print it
-            values[i] = message[cursor:next]
-            logfile.write(f"    {i:03d}<{values[i]}>\n")
-            # Update cursor position
-            cursor = next
-
-    logfile.write("\n")
-
-    if message_type in ["1110", "1130", "1430"]:
-        return values[39]
+    if message[0:4] in decoder.responses:
+        return decoder.Message(message)[39]
     else:
         return
 
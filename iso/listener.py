@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+"""Stands in for the ISO Listener, so that iso.py can be run and load tested without access to Temenos.
+It speaks the same framing as the real one and answers authorizations, advices and reversals with an action code (DE039)"""
+
+
+# Import from the Standard Library
+import sys
+import re
+import random
+import string
+import asyncio
+
+# Import from local directories
+import all956
+import decoder
+import framing
+
+
+# Global variables
+address = ("127.0.0.1", 4620) # Where the mock ISO Listener accepts connections
+backlog = 4096 # Connections waiting to be accepted, enough for thousands of clients connecting at once
+field = all956.Fields() # Only used for the field lengths when building the responses
+responses = {"1100": "1110", "1120": "1130", "1121": "1130", "1420": "1430", "1421": "1430", "1804": "1814"} # Repeats are answered like the original messages
+echoed = [2, 3, 4, 6, 7, 11, 12, 24, 32, 37, 41, 42, 49, 51, 93, 94] # Fields copied from the request to the response
+stats = {"connections": 0, "requests": 0, "approved": 0, "declined": 0, "dropped": 0}
+
+
+class Config:
+    """Defines how the mock ISO Listener responds"""
+
+    def __init__(self, latency=(0, 0), drop=0, rules=None, seed=None):
+
+        self.latency = latency # Minimum and maximum delay before responding, in seconds
+        self.drop = drop # Share of requests left without a response, between 0 and 1
+        self.rules = rules if rules is not None else [] # Lists of (field, pattern, action code), the first match wins
+        self.random = random.Random(seed)
+
+    def action(self, values):
+        """Returns the action code (DE039) for a request"""
+
+        match values[0]:
+
+            case "1420" | "1421":
+                return "400"
+
+            case "1804":
+                return "800"
+
+        for number, pattern, code in self.rules:
+            if re.search(pattern, values[number]):
+                return code
+
+        return "000"
+
+    def delay(self):
+        """Returns how long to wait before responding"""
+
+        return self.random.uniform(*self.latency)
+
+    def approval(self):
+        """Returns a random approval code (DE038)"""
+
+        return "".join(self.random.choices(string.ascii_uppercase + string.digits, k=field.len[38]))
+
+
+def respond(values, code, approval=""):
+    """Builds the response to a request from its decoded fields, the action code and, for approvals, the approval code"""
+
+    # The secondary bitmap is always present, like in the requests
+    bitmap = 1 << 127
+    content = ""
+
+    for i in range(2, field.count):
+        if i == 39:
+            value = code
+        elif i == 38 and code == "000":
+            value = approval
+        elif i in echoed:
+            value = values[i]
+        else:
+            continue
+        if value == "":
+            continue
+        bitmap |= 1 << (128 - i)
+        if field.var_len[i] != 0:
+            value = f"{len(value):0{field.var_len[i]}d}" + value
+        content += value
+
+    return responses[values[0]] + f"{bitmap:032X}" + content
+
+
+async def handle(reader, writer, config):
+    """Answers the requests received on a connection, each after its own delay and possibly out of order"""
+
+    stats["connections"] += 1
+    framer = framing.Framer()
+    loop = asyncio.get_running_loop()
+
+    try:
+        while True:
+            data = await reader.read(65536)
+            if data == b"":
+                break
+
+            for frame in framer.feed(data):
+                stats["requests"] += 1
+                # Requests are split the same way the client splits the responses
+                values = decoder.Message(frame)
+                if values[0] not in responses:
+                    print(f"Message type {values[0]} not supported")
+                    continue
+
+                if config.random.random() < config.drop:
+                    stats["dropped"] += 1
+                    continue
+
+                code = config.action(values)
+                if values[0] in ["1100", "1120", "1121"]:
+                    if code == "000":
+                        stats["approved"] += 1
+                    else:
+                        stats["declined"] += 1
+
+                response = framing.encode(respond(values, code, config.approval()))
+                delay = config.delay()
+                if delay > 0:
+                    loop.call_later(delay, write, writer, response)
+                else:
+                    writer.write(response)
+
+            await writer.drain()
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        stats["connections"] -= 1
+        writer.close()
+
+
+def write(writer, response):
+    """Writes a delayed response, unless the client has gone in the meantime"""
+
+    if not writer.is_closing():
+        writer.write(response)
+
+
+async def serve(host, port, config):
+    """Starts accepting connections and returns the server"""
+
+    return await asyncio.start_server(lambda reader, writer: handle(reader, writer, config), host, port, backlog=backlog)
+
+
+async def run(config):
+    """Serves until interrupted"""
+
+    server = await serve(*address, config)
+    print(f"Listening on {address[0]}:{address[1]}\n")
+
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+
+    config = argparse()
+
+    try:
+        asyncio.run(run(config))
+    except KeyboardInterrupt:
+        pass
+
+    print(f"\n{stats['requests']} requests: {stats['approved']} approved, {stats['declined']} declined, {stats['dropped']} dropped")
+    sys.exit(0)
+
+
+def argparse():
+    """Parses arguments from the terminal"""
+
+    global address
+    config = Config()
+
+    # Check correct usage
+    if "--help" in sys.argv or "-h" in sys.argv:
+        print("Correct usage: ./listener.py (--host=ADDR:PORT) (--latency=MS(:MS)) (--drop=RATE) (--decline=DE:PATTERN:CODE ...) (--seed=N)")
+        sys.exit(1)
+
+    # Parse arguments
+    for arg in sys.argv:
+        if re.match("^.*listener.py$", arg):
+            pass
+        elif re.match("^--host=[^:]+:[0-9]+$", arg):
+            host, port = arg[7:].rsplit(":", 1)
+            address = (host, int(port))
+        elif re.match("^--latency=[0-9]+(:[0-9]+)?$", arg):
+            latency = [int(value) / 1000 for value in arg[10:].split(":")]
+            config.latency = (latency[0], latency[-1])
+        elif re.match("^--drop=[0-9]+([.][0-9]+)?$", arg):
+            config.drop = float(arg[7:])
+            if config.drop > 1:
+                print("The drop rate must be between 0 and 1")
+                sys.exit(1)
+        elif re.match("^--decline=[0-9]+:.+:[0-9]{3}$", arg):
+            number, rest = arg[10:].split(":", 1)
+            pattern, code = rest.rsplit(":", 1)
+            if not 2 <= int(number) < field.count:
+                print(f"Field {number} does not exist")
+                sys.exit(1)
+            config.rules.append((int(number), pattern, code))
+        elif re.match("^--seed=[0-9]+$", arg):
+            config.random.seed(int(arg[7:]))
+        else:
+            print(f"{arg} is not a valid argument")
+            sys.exit(1)
+
+    return config
+
+
+if __name__ == "__main__":
+    main()
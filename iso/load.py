@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+"""Open-loop load generator: sends messages to the ISO Listener at a target arrival rate for a fixed duration.
+Messages go out on schedule whatever the response times, so a slow ISO Listener shows up as growing latency rather than as a lower rate"""
+
+
+# Import from the Standard Library
+import sys
+import re
+import os
+import csv
+import json
+import time
+import random
+import asyncio
+import datetime
+import itertools
+import multiprocessing
+
+# Import from local directories
+import all956
+import decoder
+import framing
+import session
+import stats
+
+
+# Global variables
+address = ("10.110.50.147", 462) # Temenos ISO Listener
+limit = 10000 # Requests in flight at most. Arrivals beyond it are skipped and counted, so that the schedule is never delayed
+progress = None # Messages sent, completed and timed out by each worker process, shared with the parent process
+
+
+class Generator:
+    """Composes messages with its own Fields and sends them through a pool of connections at scheduled times"""
+
+    def __init__(self, pool, rows, fieldnames, timers=None):
+
+        self.pool = pool # Connections to the ISO Listener
+        self.rows = rows # Endless iterator over the template rows to send
+        self.fieldnames = fieldnames
+        self.field = all956.Fields()
+        self.encoder = framing.Encoder()
+        self.timers = timers if timers is not None else stats.Stats() # Time spent in each stage
+        self.response_codes = {} # Number of responses received for each DE039 value
+        self.sent = 0
+        self.skipped = 0 # Arrivals dropped because limit requests were already in flight
+        self.timeout_count = 0
+        self.sending = 0 # Seconds it took to send every message, longer than the duration when the generator falls behind
+        self.tasks = set() # Requests in flight
+
+    async def run(self, tps, duration, poisson=False, seed=None):
+        """Sends messages at tps per second on average for duration seconds, then waits for the requests still in flight"""
+
+        loop = asyncio.get_running_loop()
+        arrivals = random.Random(seed)
+        self.timers.start()
+        start = intended = loop.time()
+
+        while intended < start + duration:
+            # Running late doesn't delay the next arrivals, but the event loop still gets to process the responses
+            await asyncio.sleep(max(intended - loop.time(), 0))
+
+            if len(self.tasks) >= limit:
+                self.skipped += 1
+            else:
+                self.submit(intended, loop)
+
+            intended += arrivals.expovariate(tps) if poisson else 1 / tps
+
+        self.sending = loop.time() - start
+        await asyncio.gather(*self.tasks)
+        self.timers.stop()
+
+    def submit(self, intended, loop):
+        """Composes the next message and sends it without waiting for the response"""
+
+        # Resetting the fields is timed apart from filling them
+        row = dict(next(self.rows))
+        begin = time.perf_counter_ns()
+        self.field.prepare(row)
+        filling = time.perf_counter_ns()
+        message = self.field.fill(row, self.fieldnames)
+        lap = time.perf_counter_ns()
+        self.timers.add("start", filling - begin)
+        self.timers.add("fill", lap - filling)
+
+        # The transport may hold on to the data until it can be sent, so it gets a copy of the buffer
+        request = bytes(self.encoder.encode(self.field.val[0], self.field.binary_bitmap(), self.field.content))
+        self.timers.add("encode", time.perf_counter_ns() - lap)
+
+        # How far behind schedule the message is leaving
+        self.timers.add("lag", round((loop.time() - intended) * 1e9))
+
+        task = asyncio.create_task(self.deliver(message, request, intended, loop))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        self.sent += 1
+
+    async def deliver(self, message, request, intended, loop):
+        """Sends a message and records its round trip, and its latency since it was scheduled"""
+
+        begin = time.perf_counter_ns()
+        response = await self.pool.exchange(message, request)
+        self.timers.add("round trip", time.perf_counter_ns() - begin)
+        self.timers.add("latency", round((loop.time() - intended) * 1e9))
+        self.timers.messages += 1
+
+        if response == session.timeout_message:
+            self.timeout_count += 1
+        elif response[0:4] in decoder.responses:
+            code = decoder.Message(response)[39]
+            self.response_codes[code] = self.response_codes.get(code, 0) + 1
+
+    def results(self, tps, duration):
+        """Returns the outcome of the run with its stats, as saved in JSON"""
+
+        return {
+            "target_tps": tps,
+            "duration": duration,
+            "sent": self.sent,
+            "sending": self.sending,
+            "skipped": self.skipped,
+            "timeouts": self.timeout_count,
+            "response_codes": self.response_codes,
+            "stats": self.timers.to_dict()
+        }
+
+
+def main():
+
+    args = argparse()
+
+    fieldnames, rows = workload(args["in_filename"], args["mix"], args["seed"])
+
+    print(f"Sending {args['tps']:g} TPS for {args['duration']:g} seconds\n")
+    try:
+        if args["workers"] > 1:
+            results = drive(args)
+        else:
+            generator = asyncio.run(run(rows, fieldnames, args, args["tps"], args["seed"]))
+            results = generator.results(args["tps"], args["duration"])
+    except (ConnectionError, TimeoutError):
+        print("Can't establish a connection")
+        sys.exit(2)
+
+    report(results)
+    if args["stats"] is True:
+        os.makedirs(os.path.dirname(args["stats_filename"]), exist_ok=True)
+        with open(args["stats_filename"], "w") as outfile:
+            json.dump(results, outfile, indent=4)
+        print(all956.esc("green") + args["stats_filename"] + all956.esc("default") + " generated\n")
+
+    sys.exit(0)
+
+
+async def run(rows, fieldnames, args, tps, seed=None, slot=None):
+    """Opens the connections, runs the load and closes them. Worker processes publish their progress in their slot"""
+
+    pool = session.Pool(address, args["connections"])
+    await pool.open()
+
+    generator = Generator(pool, rows, fieldnames)
+    if slot is not None:
+        publisher = asyncio.create_task(publish(generator, slot))
+    try:
+        await generator.run(tps, args["duration"], args["poisson"], seed)
+    finally:
+        if slot is not None:
+            publisher.cancel()
+            share(generator, slot)
+        await pool.close()
+
+    if pool.reconnect_count > 0:
+        print(f"Connections re-established {pool.reconnect_count} times\n")
+
+    return generator
+
+
+def drive(args):
+    """Spreads the load over several worker processes, printing their progress. Returns their results merged"""
+
+    workers = args["workers"]
+
+    # Every worker takes its own share of the STANs, RRNs and other codes of a sequence with the same key
+    key = random.getrandbits(64)
+
+    shared = multiprocessing.Array("q", 3 * workers, lock=False)
+    with multiprocessing.Pool(workers, initializer=start_worker, initargs=(shared,)) as pool:
+        pending = [pool.apply_async(work, (i, workers, key, args)) for i in range(workers)]
+
+        started = time.monotonic()
+        while not all(result.ready() for result in pending):
+            time.sleep(1)
+            elapsed = time.monotonic() - started
+            sent, completed, timeouts = sum(shared[0::3]), sum(shared[1::3]), sum(shared[2::3])
+            print(f"\r{elapsed:.0f} s: {sent} sent ({sent / elapsed:.1f} TPS), {completed} completed, {sent - completed} in flight, {timeouts} timeouts ", end="", flush=True)
+        print("\n")
+
+        return merge([result.get() for result in pending])
+
+
+def start_worker(shared):
+    """Sets up a worker process with the slots it publishes its progress in"""
+    global progress
+
+    progress = shared
+
+
+def work(index, workers, key, args):
+    """Runs a worker's share of the load with its own connections and Fields. Returns its results"""
+
+    # Forked workers would otherwise share the same random state
+    random.seed()
+    for space in [all956.RAND_MAX6, all956.RAND_MAX12]:
+        all956.sequences[space] = all956.Sequence(space, key, (index, workers))
+
+    seed = args["seed"] + index if args["seed"] is not None else None
+    fieldnames, rows = workload(args["in_filename"], args["mix"], seed)
+    generator = asyncio.run(run(rows, fieldnames, args, args["tps"] / workers, seed, index))
+    return generator.results(args["tps"] / workers, args["duration"])
+
+
+async def publish(generator, slot):
+    """Shares the progress of a worker with the parent process twice a second"""
+
+    while True:
+        share(generator, slot)
+        await asyncio.sleep(0.5)
+
+
+def share(generator, slot):
+    progress[3 * slot:3 * slot + 3] = [generator.sent, generator.timers.messages, generator.timeout_count]
+
+
+def merge(results):
+    """Adds up the results of the worker processes, merging their histograms"""
+
+    timers = stats.Stats.from_dict(results[0]["stats"])
+    codes = {}
+    for result in results[1:]:
+        timers.merge(stats.Stats.from_dict(result["stats"]))
+    for result in results:
+        for code, count in result["response_codes"].items():
+            codes[code] = codes.get(code, 0) + count
+
+    return {
+        "workers": len(results),
+        "target_tps": sum(result["target_tps"] for result in results),
+        "duration": results[0]["duration"],
+        "sent": sum(result["sent"] for result in results),
+        "sending": max(result["sending"] for result in results),
+        "skipped": sum(result["skipped"] for result in results),
+        "timeouts": sum(result["timeouts"] for result in results),
+        "response_codes": codes,
+        "stats": timers.to_dict()
+    }
+
+
+def workload(path, mix, seed=None):
+    """Returns the template's field names and an endless iterator over the rows to send: the template rows in a loop,
+    or rows made of a preset only, picked at random according to the weights in mix"""
+
+    with open(path, encoding="utf-8-sig") as infile:
+        reader = csv.DictReader(infile)
+        template = list(reader)
+        fieldnames = reader.fieldnames
+
+    if len(fieldnames) != 131:
+        print(f"{path} contains an incorrect template")
+        sys.exit(1)
+
+    if not mix:
+        return fieldnames, itertools.cycle(template)
+
+    presets = []
+    for preset in mix:
+        row = {name: "" for name in fieldnames}
+        row["Scenario"] = row["Preset"] = preset
+        presets.append(row)
+    weights = list(mix.values())
+    picker = random.Random(seed)
+
+    return fieldnames, (picker.choices(presets, weights)[0] for i in itertools.count())
+
+
+def report(results):
+    """Prints the latency of each stage, the throughput and the response codes"""
+
+    print(stats.Stats.from_dict(results["stats"]).summary())
+    print(f"Sent: {results['sent']} in {results['sending']:.2f} s ({results['sent'] / results['sending']:.1f} TPS, the target was {results['target_tps']:g})")
+    print(f"Skipped: {results['skipped']} (more than {limit} requests in flight)")
+    print(f"Timeouts: {results['timeouts']}")
+    for code, count in sorted(results["response_codes"].items()):
+        print(f"DE039 {code}: {count}")
+    print()
+
+
+def argparse():
+    """Parses arguments from the terminal"""
+
+    # Initialize variables
+    args = {
+        "in_filename": "",
+        "duration": 0,
+        "tps": 0,
+        "mix": {},
+        "connections": 1,
+        "poisson": False,
+        "workers": 1,
+        "seed": None,
+        "stats": False,
+        "stats_filename": ""
+    }
+    global address
+
+    # Check correct usage
+    if "--help" in sys.argv or "-h" in sys.argv or len(sys.argv) < 4:
+        print("Correct usage: ./load.py in/'input_file'.csv --duration=SECONDS --tps=N (--mix=PRESET:WEIGHT,...) (--host=ADDR:PORT) (--connections=N) (--workers=N) (--poisson) (--seed=N) (--echo=SECONDS) (--stats)")
+        sys.exit(1)
+
+    # Parse arguments
+    for arg in sys.argv:
+        if re.match("^.*load.py$", arg):
+            pass
+        elif re.match("in/", arg):
+            args["in_filename"] = arg
+            if not re.match("^.*.csv$", args["in_filename"]):
+                args["in_filename"] += ".csv"
+        elif re.match("^--duration=[0-9]+([.][0-9]+)?$", arg):
+            args["duration"] = float(arg[11:])
+        elif re.match("^--tps=[0-9]+([.][0-9]+)?$", arg):
+            args["tps"] = float(arg[6:])
+        elif re.match("^--mix=[^:,]+:[0-9]+([.][0-9]+)?(,[^:,]+:[0-9]+([.][0-9]+)?)*$", arg):
+            for item in arg[6:].split(","):
+                preset, weight = item.rsplit(":", 1)
+                args["mix"][preset] = float(weight)
+        elif re.match("^--host=[^:]+:[0-9]+$", arg):
+            host, port = arg[7:].rsplit(":", 1)
+            address = (host, int(port))
+        elif re.match("^--connections=[0-9]+$", arg):
+            args["connections"] = max(int(arg[14:]), 1)
+        elif re.match("^--workers=[0-9]+$", arg):
+            args["workers"] = max(int(arg[10:]), 1)
+        elif arg == "--poisson":
+            args["poisson"] = True
+        elif re.match("^--seed=[0-9]+$", arg):
+            args["seed"] = int(arg[7:])
+        elif re.match("^--echo=[0-9]+$", arg):
+            session.echo_interval = max(int(arg[7:]), 1)
+        elif arg == "--stats":
+            args["stats"] = True
+        else:
+            print(f"{arg} is not a valid argument")
+            sys.exit(1)
+
+    if not os.path.exists(args["in_filename"]):
+        print(f"{args['in_filename'] or 'Input file'} not found. Type in/'filename'.csv to choose an input file")
+        sys.exit(1)
+    if args["duration"] <= 0 or args["tps"] <= 0:
+        print("Both --duration and --tps must be greater than 0")
+        sys.exit(1)
+    if args["mix"] and sum(args["mix"].values()) <= 0:
+        print("At least one preset of the mix must have a weight greater than 0")
+        sys.exit(1)
+
+    # Stats are saved in the out folder next to this script, whatever the working directory, named after the template
+    args["stats_filename"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "out", "") + os.path.basename(args["in_filename"])[:-4] + "_load_" + datetime.datetime.today().strftime("%y%m%d%H%M%S") + ".json"
+
+    return args
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Writes the human-readable log of the messages exchanged from a background thread, so that logging stays off the send/receive path"""
+
+
+# Import from the Standard Library
+import atexit
+import queue
+import threading
+import time
+
+# Import from local directories
+import all956
+import decoder
+
+
+# Global variables
+flush_interval = 1 # Seconds the log lines can wait in memory before being written to the file
+queue_size = 10000 # Messages that can wait to be logged. When the queue is full, the caller waits for the writer to catch up
+block_size = 1000 # Messages written to the file at once at most
+message_types = all956.Fields().present.keys() # Message types that can be split into fields, the others are logged as they are
+
+
+class Writer:
+    """Log file fed by a bounded queue of raw messages, which are formatted and written in blocks by a background thread"""
+
+    def __init__(self, path, interval=None):
+
+        self.name = path
+        self.file = open(path, "a")
+        self.interval = interval if interval is not None else flush_interval
+        self.queue = queue.Queue(queue_size)
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name=f"Log writer {path}", daemon=True)
+        self.thread.start()
+
+        # Whatever is still queued when the program exits early is written anyway
+        atexit.register(self.close)
+
+    def write(self, message):
+        """Queues a raw message (or any other line) for the log"""
+        self.queue.put(message)
+
+    def run(self):
+        """Formats the queued messages and writes them to the file every self.interval seconds, or as soon as a block is full"""
+
+        block = []
+        last_flush = time.monotonic()
+
+        while True:
+            try:
+                message = self.queue.get(timeout=self.interval)
+            except queue.Empty:
+                message = ""
+
+            # None is queued by close()
+            if message is not None and message != "":
+                block.append(text(message))
+
+            if message is None or len(block) >= block_size or time.monotonic() - last_flush >= self.interval:
+                if block:
+                    self.file.write("".join(block))
+                    self.file.flush()
+                    block = []
+                last_flush = time.monotonic()
+
+            if message is None:
+                return
+
+    def close(self):
+        """Writes whatever is still queued and closes the file"""
+
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+        atexit.unregister(self.close)
+
+
+def text(message):
+    """Returns a raw message in human-readable format. Anything that isn't a known message is logged as it is"""
+
+    if message[0:4] not in message_types:
+        return f"{message}\n\n"
+    return decoder.Message(message).text()
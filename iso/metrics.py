@@ -0,0 +1,144 @@
+"""Exposes live counters and latency histograms of a run in the Prometheus text format, over HTTP or in a file rewritten periodically"""
+
+
+# Import from the Standard Library
+import os
+import threading
+import http.server
+
+# Import from local directories
+import stats
+
+
+# Global variables
+interval = 5 # Seconds between two rewrites of the metrics file
+bounds = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10] # Upper bounds of the histogram buckets, in seconds
+
+
+class Metrics:
+    """Counters of the messages exchanged with the ISO Listener, updated by iso.py and session.py as the run goes"""
+
+    def __init__(self):
+
+        self.sent = {} # Messages sent, by message type
+        self.responses = {} # Responses to the transactions, by action code (DE039). Network management responses are left out
+        self.timeouts = 0 # Messages left without a response
+        self.reconnects = 0 # Connections re-established after going down
+        self.echo = stats.Histogram() # Round trip of the echo messages, in nanoseconds
+        self.in_flight = lambda: 0 # Returns the number of requests awaiting a response
+        self.timers = None # Stats of the run, whose stages are exposed as histograms as well
+
+    def count_sent(self, message_type):
+        self.sent[message_type] = self.sent.get(message_type, 0) + 1
+
+    def count_response(self, code):
+        self.responses[code] = self.responses.get(code, 0) + 1
+
+    def render(self):
+        """Returns the metrics in the Prometheus text exposition format"""
+
+        lines = []
+        family(lines, "iso_messages_sent_total", "counter", "Messages sent to the ISO Listener, by message type", [(f'{{mti="{mti}"}}', count) for mti, count in sorted(self.sent.items())])
+        family(lines, "iso_responses_total", "counter", "Responses to the transactions received from the ISO Listener, by action code (DE039)", [(f'{{code="{code}"}}', count) for code, count in sorted(self.responses.items())])
+        family(lines, "iso_timeouts_total", "counter", "Messages left without a response", [("", self.timeouts)])
+        family(lines, "iso_reconnects_total", "counter", "Connections re-established after going down", [("", self.reconnects)])
+        family(lines, "iso_in_flight", "gauge", "Requests awaiting a response", [("", self.in_flight())])
+
+        family(lines, "iso_echo_round_trip_seconds", "histogram", "Round trip of the echo messages", histogram(self.echo))
+        if self.timers is not None:
+            samples = []
+            for stage, values in list(self.timers.stages.items()):
+                samples += histogram(values, f'stage="{stage}"')
+            family(lines, "iso_stage_seconds", "histogram", "Time spent in each stage of a message, see stats.py", samples)
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port):
+        """Answers GET /metrics on localhost from a background thread"""
+
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=server.serve_forever, name="Metrics server", daemon=True).start()
+        return server
+
+    def write(self, path):
+        """Rewrites the metrics file every interval seconds from a background thread. Returns a function that stops it"""
+
+        stop = threading.Event()
+
+        def run():
+            while True:
+                self.dump(path)
+                if stop.wait(interval):
+                    self.dump(path)
+                    return
+
+        thread = threading.Thread(target=run, name="Metrics writer", daemon=True)
+        thread.start()
+
+        def close():
+            stop.set()
+            thread.join()
+
+        return close
+
+    def dump(self, path):
+        """Writes the metrics to a file, replacing it at once so that readers never see it half written"""
+
+        with open(path + ".tmp", "w") as outfile:
+            outfile.write(self.render())
+        os.replace(path + ".tmp", path)
+
+
+def family(lines, name, kind, description, samples):
+    """Appends a metric with its help and type lines. Samples are (labels, value), or (suffix, labels, value) for histograms"""
+
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} {kind}")
+    for sample in samples:
+        if len(sample) == 3:
+            lines.append(f"{name}{sample[0]}{sample[1]} {sample[2]}")
+        else:
+            lines.append(f"{name}{sample[0]} {sample[1]}")
+
+
+def histogram(values, labels=""):
+    """Returns the samples of a Prometheus histogram from a stats.Histogram in nanoseconds"""
+
+    counts = dict(values.counts)
+    separator = "," if labels else ""
+    cumulative = [0 for bound in bounds]
+    for index, count in counts.items():
+        highest = stats.highest(index) / 1e9
+        for i, bound in enumerate(bounds):
+            if highest <= bound:
+                cumulative[i] += count
+                break
+    for i in range(1, len(bounds)):
+        cumulative[i] += cumulative[i - 1]
+
+    total = sum(counts.values())
+    samples = [("_bucket", f'{{{labels}{separator}le="{bound}"}}', count) for bound, count in zip(bounds, cumulative)]
+    samples.append(("_bucket", f'{{{labels}{separator}le="+Inf"}}', total))
+    samples.append(("_sum", f"{{{labels}}}" if labels else "", values.total / 1e9))
+    samples.append(("_count", f"{{{labels}}}" if labels else "", total))
+    return samples
+
+
+collector = Metrics() # Metrics of the current run
@@ -0,0 +1,79 @@
+"""Controls the pace at which messages are sent to the ISO Listener"""
+
+
+# Import from the Standard Library
+import time
+import asyncio
+
+
+# Global variables
+resolution = 0.001 # Shortest wait, in seconds
+step = 0.01 # Longest wait while the rate is changing, in seconds
+
+
+class Bucket:
+    """Token bucket releasing messages at a target rate, with optional ramp-up and ramp-down phases"""
+
+    def __init__(self, tps, burst=1, ramp_up=0, ramp_down=0, total=None, duration=None):
+
+        self.tps = tps # Target rate, in messages per second
+        self.burst = burst # Maximum number of messages that can be released back to back
+        self.ramp_up = ramp_up # Seconds to get from 0 to the target rate
+        self.ramp_down = ramp_down # Seconds to get from the target rate back to 0
+        self.duration = duration # Length of the whole run in seconds, needed to know when to ramp down
+        self.total = total # Number of messages in the run, used instead of the duration to know when to ramp down
+        self.released = 0 # Messages released so far
+        self.tokens = 1 # Messages that can be released right away
+        self.started = None # When the first message was requested
+        self.last = 0 # When the tokens were last refilled, in seconds since self.started
+
+    def rate(self, now):
+        """Returns the target rate at a given time, in seconds since the first message"""
+
+        rate = self.tps
+        if self.ramp_up > 0 and now < self.ramp_up:
+            rate = min(rate, self.tps * now / self.ramp_up)
+        if self.ramp_down > 0 and self.total is not None:
+            # Slow down as the last messages approach, so that the ramp lasts self.ramp_down even when the run is behind schedule
+            rate = min(rate, (2 * self.tps * max(self.total - self.released, 0) / self.ramp_down) ** 0.5)
+        elif self.ramp_down > 0 and self.duration is not None and now > self.duration - self.ramp_down:
+            rate = min(rate, self.tps * max(self.duration - now, 0) / self.ramp_down)
+
+        # Never stop completely, so that a message left over at the end of a ramp still goes out
+        return max(rate, self.tps / 100)
+
+    def delay(self):
+        """Takes a token if there is one, otherwise returns how many seconds to wait before trying again"""
+
+        if self.started is None:
+            self.started = time.monotonic()
+        now = time.monotonic() - self.started
+
+        # Refill with the tokens generated since the last time, averaging the rate over the interval
+        self.tokens = min(self.tokens + (self.rate(self.last) + self.rate(now)) / 2 * (now - self.last), self.burst)
+        self.last = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.released += 1
+            return 0
+
+        delay = max((1 - self.tokens) / self.rate(now), resolution)
+
+        # During the ramps the rate changes quickly, check again soon
+        if self.rate(now) < self.tps:
+            delay = min(delay, step)
+
+        return delay
+
+    def wait(self):
+        """Blocks until the next message can be sent"""
+
+        while (delay := self.delay()) > 0:
+            time.sleep(delay)
+
+    async def acquire(self):
+        """Waits until the next message can be sent, without blocking the event loop"""
+
+        while (delay := self.delay()) > 0:
+            await asyncio.sleep(delay)
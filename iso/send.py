@@ -6,6 +6,9 @@ import sys
 import socket
 socket.setdefaulttimeout(3)
 
+# Import from local directories
+import framing
+
 
 def main():
     """Send ISO messages to Temenos UAT ISO Listener"""
@@ -35,13 +38,9 @@ def main():
         if feedback == None:
             print(f"Request ({str(int(request['len']))} bytes long): {request['value']} ")
             response = {}
-            response["binary"] = tcp_socket.recv(1024)
-            response["len"] = response["binary"][0:4].decode("utf-8")
-            response["msg_type"] = response["binary"][4:8].decode("utf-8")
-            response["bitmap"] = response["binary"][8:24].hex().upper()
-            response["content"] = response["binary"][24:].decode("utf-8")
-            response["value"] = response["msg_type"] + response["bitmap"] + response["content"]
-            print(f"Response ({str(int(response['len']))} bytes long): {response['value']}")
+            response["binary"] = framing.Framer().read(tcp_socket)
+            response["value"] = framing.decode(response["binary"])
+            print(f"Response ({len(response['binary'])} bytes long): {response['value']}")
 
     finally:
         print("Closing socket")
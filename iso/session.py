@@ -0,0 +1,398 @@
+"""Runs ISO 8583 sessions with the ISO Listener on an asyncio event loop, so that many of them can share a single process"""
+
+
+# Import from the Standard Library
+import asyncio
+import time
+
+# Import from local directories
+import all956
+import decoder
+import framing
+import stats
+import metrics
+
+
+# Global variables
+timeout = 3 # Seconds to wait for the ISO Listener before giving up
+reconnect_delay = 30 # Maximum number of seconds between two attempts to reconnect
+echo_interval = 10 # Seconds a connection can go without receiving anything before an echo message is sent
+echo_failures = 2 # Number of messages in a row left unanswered before a connection is considered dead
+timeout_message = "Timeout"
+
+
+class Connection:
+    """Defines a single TCP/IP connection to the ISO Listener and the requests in flight on it"""
+
+    def __init__(self, address, name=""):
+
+        self.address = address # Host and port of the ISO Listener
+        self.name = name
+        self.network = all956.Network()
+        self.framer = framing.Framer()
+        self.reader = None
+        self.writer = None
+        self.listener = None # Task dispatching the responses to the requests in flight
+        self.heartbeat_task = None # Task sending echo messages when the connection is idle
+        self.in_flight = {} # Requests awaiting a response, keyed by STAN (DE011) and RRN (DE037)
+        self.last_activity = 0 # When something was last received. Sending doesn't count, since a listener may accept messages without answering them
+        self.timeouts = 0 # Messages in a row left without a response
+        self.alive = False
+
+    async def open(self):
+        """Opens the connection and signs on"""
+
+        self.framer = framing.Framer()
+        self.timeouts = 0
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(*self.address), timeout)
+        self.listener = asyncio.create_task(self.listen())
+        self.alive = True
+
+        if await self.exchange(self.network.get("signon")) == timeout_message:
+            await self.disconnect()
+            raise ConnectionError(f"Connection {self.name}: can't establish a connection")
+
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+
+    async def close(self):
+        """Signs off and closes the connection"""
+
+        if self.alive:
+            await self.exchange(self.network.get("signoff"))
+        await self.disconnect()
+
+    async def disconnect(self):
+        """Stops listening and closes the socket"""
+
+        self.alive = False
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+        if self.listener is not None:
+            self.listener.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def exchange(self, message, request=None):
+        """Sends a message and waits for the response with the same STAN (DE011) and RRN (DE037). The binary form can be passed as well"""
+
+        if not self.alive:
+            raise ConnectionError(f"Connection {self.name} is down")
+
+        decoded = decoder.Message(message)
+        key = (decoded[11], decoded[37])
+        response = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = response
+
+        # Once the message is written it may have reached the ISO Listener, so a broken connection is treated like a timeout
+        try:
+            self.writer.write(request if request is not None else framing.encode(message))
+            metrics.collector.count_sent(message[0:4])
+            await self.writer.drain()
+            return await asyncio.wait_for(response, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            metrics.collector.timeouts += 1
+            return timeout_message
+        except ConnectionError:
+            metrics.collector.timeouts += 1
+            return timeout_message
+        finally:
+            self.in_flight.pop(key, None)
+
+    async def heartbeat(self):
+        """Sends an echo message whenever nothing has been received for echo_interval seconds"""
+
+        failures = 0
+
+        while self.alive:
+            idle = time.monotonic() - self.last_activity
+            if idle < echo_interval:
+                await asyncio.sleep(echo_interval - idle)
+                continue
+
+            # Runs alongside the transactions, which don't have to wait for the echo response
+            sent = time.perf_counter_ns()
+            try:
+                response = await self.exchange(self.network.get("echo"))
+            except ConnectionError:
+                return
+            if response != timeout_message:
+                metrics.collector.echo.record(time.perf_counter_ns() - sent)
+                failures = 0
+                continue
+
+            failures += 1
+            print(f"Connection {self.name}: echo timeout")
+            if failures >= echo_failures:
+                # Closing the socket makes the listener give up on the requests in flight, the pool then reconnects
+                self.writer.close()
+                return
+
+    async def listen(self):
+        """Receives the responses and hands each of them to the request it answers"""
+
+        try:
+            while True:
+                data = await self.reader.read(65536)
+                if data == b"":
+                    break
+                self.last_activity = time.monotonic()
+                self.timeouts = 0
+
+                for frame in self.framer.feed(data):
+                    response = framing.decode(frame)
+                    decoded = decoder.Message(frame)
+                    key = (decoded[11], decoded[37])
+                    if decoded[0] in decoder.responses:
+                        metrics.collector.count_response(decoded[39])
+
+                    # Some responses don't echo DE037 back: fall back on the STAN alone
+                    if key not in self.in_flight:
+                        key = next((pending_key for pending_key in self.in_flight if pending_key[0] == decoded[11]), None)
+                    if key is None:
+                        print(f"Connection {self.name}: no request in flight matches response {response}\n")
+                        continue
+
+                    request = self.in_flight.pop(key)
+                    if not request.done():
+                        request.set_result(response)
+        except (ConnectionError, ValueError):
+            pass
+
+        # Whatever is in flight won't get a response
+        self.alive = False
+        for request in self.in_flight.values():
+            if not request.done():
+                request.set_exception(ConnectionError(f"Connection {self.name}: the ISO Listener closed the connection"))
+        self.in_flight.clear()
+
+
+class Pool:
+    """Spreads messages over several connections to the ISO Listener, reconnecting the ones that go down"""
+
+    def __init__(self, address, size=1):
+
+        self.connections = [Connection(address, str(i + 1)) for i in range(size)]
+        self.available = asyncio.Event() # Set while at least one connection is alive
+        self.reconnecting = {} # Reconnection tasks, keyed by connection
+        self.reconnect_count = 0
+
+    async def open(self):
+        """Opens and signs on every connection. Fails only if none of them can be established"""
+
+        results = await asyncio.gather(*(connection.open() for connection in self.connections), return_exceptions=True)
+
+        for connection, result in zip(self.connections, results):
+            if isinstance(result, Exception):
+                print(f"Connection {connection.name}: {result}")
+                self.lost(connection)
+
+        if not any(connection.alive for connection in self.connections):
+            await self.close()
+            raise ConnectionError("Can't establish a connection")
+        self.available.set()
+
+    async def close(self):
+        """Stops reconnecting and signs off every connection"""
+
+        for task in self.reconnecting.values():
+            task.cancel()
+        await asyncio.gather(*(connection.close() for connection in self.connections), return_exceptions=True)
+
+    async def exchange(self, message, request=None):
+        """Sends a message on the least busy connection and returns the response"""
+
+        while True:
+            connection = await self.pick()
+            if connection is None:
+                return timeout_message
+
+            # Only messages that never made it to the socket are sent again, on another connection
+            try:
+                response = await connection.exchange(message, request)
+            except ConnectionError:
+                self.lost(connection)
+                continue
+
+            # A connection that accepts messages without answering them is as good as down
+            if connection.timeouts >= echo_failures and connection.alive:
+                print(f"Connection {connection.name}: {connection.timeouts} messages in a row left unanswered\n")
+                self.lost(connection)
+            return response
+
+    async def pick(self):
+        """Returns the alive connection with the fewest requests in flight, waiting for one if they are all down"""
+
+        # Connections dropped by the ISO Listener are noticed here
+        for connection in self.connections:
+            if not connection.alive:
+                self.lost(connection)
+
+        alive = [connection for connection in self.connections if connection.alive]
+
+        if not alive:
+            self.available.clear()
+            try:
+                await asyncio.wait_for(self.available.wait(), reconnect_delay)
+            except asyncio.TimeoutError:
+                return None
+            alive = [connection for connection in self.connections if connection.alive]
+
+        return min(alive, key=lambda connection: len(connection.in_flight))
+
+    def lost(self, connection):
+        """Starts reconnecting a connection that went down, unless it is already being done"""
+
+        connection.alive = False
+        if connection not in self.reconnecting or self.reconnecting[connection].done():
+            self.reconnecting[connection] = asyncio.create_task(self.reconnect(connection))
+
+    async def reconnect(self, connection):
+        """Tries to open a connection again, waiting longer and longer between attempts"""
+
+        delay = 1
+        await connection.disconnect()
+
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await connection.open()
+            except (ConnectionError, OSError, asyncio.TimeoutError):
+                delay = min(delay * 2, reconnect_delay)
+                continue
+
+            self.reconnect_count += 1
+            metrics.collector.reconnects += 1
+            print(f"Connection {connection.name} re-established\n")
+            self.available.set()
+            return
+
+
+class Session:
+    """Defines a stream of messages with its own message state, counters and log, sent through a pool of connections"""
+
+    def __init__(self, pool, name="", logfile=None, window=1, bucket=None, timers=None):
+
+        self.pool = pool # Connections to the ISO Listener
+        self.bucket = bucket # Paces the messages, possibly together with other sessions
+        self.name = name
+        self.logfile = logfile # Log sink for the human-readable messages, if any
+        self.window = window # Maximum number of requests awaiting a response at the same time
+        self.field = all956.Fields()
+        self.encoder = framing.Encoder()
+        self.message_count = 0
+        self.timeout_count = 0
+        self.response_codes = {} # Number of responses received for each DE039 value
+        self.timers = timers if timers is not None else stats.Stats() # Time spent in each stage, possibly shared with other sessions
+
+    async def run(self, rows, fieldnames):
+        """Sends the messages generated from the template rows and returns the output rows, in the same order"""
+
+        window = asyncio.Semaphore(self.window)
+        tasks = []
+
+        for row in rows:
+            await window.acquire()
+
+            # Messages are composed in order, since reversals take their data from the previous message. Resetting the fields is timed apart from filling them
+            self.message_count += 1
+            begin = time.perf_counter_ns()
+            self.field.prepare(row)
+            lap = self.lapse("start", begin)
+            message = self.field.fill(row, fieldnames)
+            lap = self.lapse("fill", lap)
+            self.log(message)
+            lap = self.lapse("log", lap)
+            output = {"Scenario": row["Scenario"], "ISO Request": message, "ISO Response": "", "Response Code": ""}
+
+            # Wait for the rate control to release the message
+            if self.bucket is not None:
+                await self.bucket.acquire()
+                lap = self.lapse("wait", lap)
+
+            # The transport may hold on to the data until it can be sent, so it gets a copy of the buffer
+            request = bytes(self.encoder.encode(self.field.val[0], self.field.binary_bitmap(), self.field.content))
+            self.lapse("encode", lap)
+            tasks.append(asyncio.create_task(self.deliver(message, request, output, window, begin)))
+
+        return await asyncio.gather(*tasks)
+
+    async def deliver(self, message, request, output, window, begin):
+        """Sends a message, stores its response in the output row and frees up its place in the window"""
+
+        lap = time.perf_counter_ns()
+        try:
+            output["ISO Response"] = await self.pool.exchange(message, request)
+        finally:
+            window.release()
+        lap = self.lapse("round trip", lap)
+
+        if output["ISO Response"] == timeout_message:
+            self.timeout_count += 1
+            print(f"Session {self.name}: message with STAN {decoder.Message(message)[11]} timed out\n")
+        else:
+            output["Response Code"] = self.log(output["ISO Response"])
+            self.response_codes[output["Response Code"]] = self.response_codes.get(output["Response Code"], 0) + 1
+            self.lapse("log", lap)
+
+        self.timers.add("message", time.perf_counter_ns() - begin)
+        self.timers.messages += 1
+        return output
+
+    def lapse(self, stage, since):
+        """Records the time elapsed since a previous lap as spent in a stage. Returns the time of this lap"""
+
+        now = time.perf_counter_ns()
+        self.timers.add(stage, now - since)
+        return now
+
+    def log(self, message):
+        """Queues a message for the log, which is written in human-readable format by the log writer. Returns DE039 for responses"""
+
+        if self.logfile is not None:
+            self.logfile.write(message)
+
+        if message[0:4] not in decoder.responses:
+            return ""
+        return decoder.Message(message)[39]
+
+
+async def run(address, rows, fieldnames, count, connections=None, window=1, logfiles=None, bucket=None, timers=None):
+    """Spreads the template rows over count concurrent sessions and returns the output rows in the original order"""
+
+    # Reversals stay in the same session as the message they reverse
+    chains = [[] for i in range(count)]
+    chain = -1
+    for index, row in enumerate(rows):
+        if not (row["Message Type"] in ["1420", "1421"] or "reversal" in row["Preset"].lower()) or chain == -1:
+            chain = (chain + 1) % count
+        chains[chain].append(index)
+
+    # By default every session gets a connection of its own
+    pool = Pool(address, connections or count)
+    await pool.open()
+    metrics.collector.in_flight = lambda: sum(len(connection.in_flight) for connection in pool.connections)
+
+    if logfiles is None:
+        logfiles = [None for i in range(count)]
+    sessions = [Session(pool, str(i + 1), logfiles[i], window, bucket, timers) for i in range(count)]
+
+    try:
+        results = await asyncio.gather(*(session.run([rows[index] for index in chains[i]], fieldnames) for i, session in enumerate(sessions)))
+    finally:
+        await pool.close()
+
+    if pool.reconnect_count > 0:
+        print(f"Connections re-established {pool.reconnect_count} times\n")
+
+    # Put the output rows back in the same order as the input file
+    outputs = [None for row in rows]
+    for i, chain in enumerate(chains):
+        for index, output in zip(chain, results[i]):
+            outputs[index] = output
+
+    return outputs
@@ -0,0 +1,179 @@
+"""Collects the time spent in each stage of a run in HDR-style latency histograms and reports their percentiles"""
+
+
+# Import from the Standard Library
+import json
+import math
+import time
+
+
+# Global variables
+SUB_BITS = 8 # Each power of 2 is split into 2 ** (SUB_BITS - 1) buckets, so values are rounded by less than 1%
+percentiles = [50, 90, 99] # Percentiles shown in the summary
+
+
+class Histogram:
+    """Counts values in buckets whose width grows with the value, like HdrHistogram, so that percentiles keep the same relative precision
+    from microseconds to seconds. Values are integers, e.g. nanoseconds"""
+
+    def __init__(self):
+
+        self.counts = {} # Number of values in each bucket, by bucket index
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value):
+        """Adds a value to the histogram"""
+
+        value = max(value, 0)
+        if value < 1 << SUB_BITS:
+            index = value
+        else:
+            shift = value.bit_length() - SUB_BITS
+            index = (shift << SUB_BITS - 1) + (value >> shift)
+
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Adds the values of another histogram to this one"""
+
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """Returns the value below which p percent of the values fall, as the highest value of its bucket"""
+
+        if self.count == 0:
+            return 0
+
+        rank = max(math.ceil(p / 100 * self.count), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(highest(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def to_dict(self):
+        return {"count": self.count, "total": self.total, "min": self.min, "max": self.max, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        # JSON turns the bucket indexes into strings
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        return histogram
+
+
+class Stats:
+    """Latency histograms of the stages of a run, in nanoseconds, with the number of messages and the duration of the run"""
+
+    def __init__(self):
+
+        self.stages = {} # Histogram of each stage, by name, in the order the stages were first recorded
+        self.messages = 0 # Messages the run went through
+        self.start()
+
+    def add(self, stage, elapsed):
+        """Records the nanoseconds spent in a stage by a message"""
+
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.record(elapsed)
+
+    def start(self):
+        """Times the run from now"""
+        self.started = time.perf_counter_ns()
+        self.stopped = None
+
+    def stop(self):
+        self.stopped = time.perf_counter_ns()
+
+    def duration(self):
+        """Returns the seconds the run lasted, up to now if it's still going"""
+        return ((self.stopped or time.perf_counter_ns()) - self.started) / 1e9
+
+    def merge(self, other):
+        """Adds the stages and the messages of another run, e.g. of another process. The duration is the longest of the two"""
+
+        for stage, histogram in other.stages.items():
+            self.stages.setdefault(stage, Histogram()).merge(histogram)
+        self.messages += other.messages
+        if other.duration() > self.duration():
+            self.started = (self.stopped or time.perf_counter_ns()) - round(other.duration() * 1e9)
+
+    def summary(self):
+        """Returns a table with the percentiles of each stage in milliseconds, and the throughput of the run"""
+
+        columns = ["Count", "Mean"] + [f"p{p}" for p in percentiles] + ["Max"]
+        text = f"{'Stage (ms)':<14}" + "".join(f"{column:>11}" for column in columns) + "\n"
+        for stage, histogram in self.stages.items():
+            values = [histogram.mean()] + [histogram.percentile(p) for p in percentiles] + [histogram.max]
+            text += f"{stage:<14}{histogram.count:>11}" + "".join(f"{value / 1e6:>11.3f}" for value in values) + "\n"
+
+        duration = self.duration()
+        throughput = self.messages / duration if duration > 0 else 0
+        return text + f"\n{self.messages} messages in {duration:.2f} s ({throughput:.1f} TPS)\n"
+
+    def to_dict(self):
+        """Returns the stats with their percentiles, in milliseconds, and the histograms needed to merge them again"""
+
+        duration = self.duration()
+        return {
+            "messages": self.messages,
+            "duration": duration,
+            "tps": self.messages / duration if duration > 0 else 0,
+            "stages": {
+                stage: {
+                    "count": histogram.count,
+                    "mean_ms": histogram.mean() / 1e6,
+                    **{f"p{p}_ms": histogram.percentile(p) / 1e6 for p in percentiles},
+                    "max_ms": histogram.max / 1e6,
+                    "histogram": histogram.to_dict()
+                }
+                for stage, histogram in self.stages.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.messages = data["messages"]
+        stats.stopped = stats.started + round(data["duration"] * 1e9)
+        stats.stages = {stage: Histogram.from_dict(values["histogram"]) for stage, values in data["stages"].items()}
+        return stats
+
+    def save(self, path):
+        with open(path, "w") as outfile:
+            json.dump(self.to_dict(), outfile, indent=4)
+
+
+def highest(index):
+    """Returns the highest value that falls in a bucket"""
+
+    if index < 1 << SUB_BITS:
+        return index
+    shift = (index >> SUB_BITS - 1) - 1
+    top = index - (shift << SUB_BITS - 1)
+    return ((top + 1) << shift) - 1
@@ -0,0 +1,180 @@
+import time
+import csv
+import asyncio
+import all956
+import listener
+import decoder
+import logwriter
+import stats
+import metrics
+import load
+from framing import Framer, Encoder, decode, encode
+from rate import Bucket
+from session import Connection, Pool
+
+
+def frame(body):
+    return f"{len(body):04d}".encode("utf-8") + body
+
+
+def test_framer_coalesced():
+    framer = Framer()
+    first = b"1110" + bytes(16) + b"000123"
+    second = b"1430" + bytes(16) + b"000456"
+    assert framer.feed(frame(first) + frame(second)) == [first, second]
+    assert framer.start == framer.end == 0
+
+
+def test_framer_split():
+    framer = Framer(size=8)
+    body = b"1110" + bytes.fromhex("F0000000000000000000000000000000") + b"X" * 2000
+    data = frame(body) + frame(body)[0:3]
+    frames = []
+    for i in range(0, len(data), 5):
+        frames += framer.feed(data[i:i + 5])
+    assert frames == [body]
+    assert framer.feed(frame(body)[3:]) == [body]
+    assert decode(body) == "1110F0000000000000000000000000000000" + "X" * 2000
+
+
+def test_bitmap_encoder():
+    with open("in/t.csv", encoding="utf-8-sig") as template:
+        reader = csv.DictReader(template)
+        field = all956.Fields()
+        for row in reader:
+            message = field.compose(row, reader.fieldnames)
+            assert message[4:36] == field.iso_hex() == field.binary_bitmap().hex().upper()
+            assert Encoder(size=16).encode(field.val[0], field.binary_bitmap(), field.content) == encode(message)
+
+
+def test_decoder():
+    with open("in/t.csv", encoding="utf-8-sig") as template:
+        reader = csv.DictReader(template)
+        field = all956.Fields()
+        for row in reader:
+            message = field.compose(row, reader.fieldnames)
+            for cut in [len(message), len(message) - 1, 40]:
+                assert decoder.Message(message[0:cut]).values() == field.parse(message[0:cut])
+            decoded = decoder.Message(encode(message)[4:])
+            assert decoded.values() == field.parse(message) and decoded.complete
+            assert decoded.text().startswith(f"<MSG-{message[0:4]}>\n    001<{message[4:36]}>\n")
+    assert decoder.Message("1110" + "4" + "0" * 31 + "06é23456")[2] == "é23456"
+    assert decoder.Message("1110" + "4" + "0" * 31 + "07123456").complete is False
+
+
+def test_log_writer(tmp_path):
+    path = tmp_path / "log.txt"
+    sink = logwriter.Writer(path, interval=60)
+    with open("in/t.csv", encoding="utf-8-sig") as template:
+        reader = csv.DictReader(template)
+        field = all956.Fields()
+        messages = [field.compose(row, reader.fieldnames) for row in reader]
+    for message in messages + ["Timeout"]:
+        sink.write(message)
+    assert path.read_text() == ""
+    sink.close()
+    assert path.read_text() == "".join(decoder.Message(message).text() for message in messages) + "Timeout\n\n"
+
+
+def test_histogram():
+    histogram, other = stats.Histogram(), stats.Histogram()
+    for value in range(1, 100001):
+        (histogram if value % 2 else other).record(value * 1000)
+    histogram.merge(other)
+    assert histogram.count == 100000 and histogram.min == 1000 and histogram.max == 100000000
+    for p in [50, 90, 99]:
+        assert abs(histogram.percentile(p) / (p * 1000000) - 1) < 0.01
+    timers = stats.Stats.from_dict(stats.Stats().to_dict())
+    timers.add("round trip", 5000)
+    assert stats.Stats.from_dict(timers.to_dict()).stages["round trip"].percentile(50) == 5000
+
+
+def test_metrics():
+    collector = metrics.Metrics()
+    collector.count_sent("1100")
+    collector.count_sent("1100")
+    collector.count_response("000")
+    for milliseconds in [2, 3, 40]:
+        collector.echo.record(milliseconds * 1000000)
+    text = collector.render()
+    assert 'iso_messages_sent_total{mti="1100"} 2\n' in text
+    assert 'iso_responses_total{code="000"} 1\n' in text
+    assert "iso_timeouts_total 0\n" in text
+    assert 'iso_echo_round_trip_seconds_bucket{le="0.0025"} 1\n' in text
+    assert 'iso_echo_round_trip_seconds_bucket{le="0.005"} 2\n' in text
+    assert 'iso_echo_round_trip_seconds_bucket{le="+Inf"} 3\n' in text
+    assert "iso_echo_round_trip_seconds_count 3\n" in text
+
+
+def test_sequence():
+    sequence = all956.Sequence(1000, key=7)
+    codes = [sequence.next() for i in range(1000)]
+    assert sorted(codes) == list(range(1, 1001))
+    same, other = all956.Sequence(1000, key=7), all956.Sequence(1000, key=8)
+    assert codes == [same.next() for i in range(1000)]
+    assert codes != [other.next() for i in range(1000)]
+    assert 1 <= sequence.next() <= 1000 and sequence.cycle == 1
+    shards = [all956.Sequence(999, key=7, shard=(i, 3)) for i in range(3)]
+    drawn = [{shard.next() for j in range(333)} for shard in shards]
+    assert set.union(*drawn) == set(range(1, 1000)) and sum(len(codes) for codes in drawn) == 999
+
+
+def test_bucket_rate():
+    bucket = Bucket(100)
+    start = time.monotonic()
+    for i in range(21):
+        bucket.wait()
+    assert 0.18 <= time.monotonic() - start < 0.5
+    assert bucket.released == 21
+
+
+def test_listener_responses():
+    with open("in/t.csv", encoding="utf-8-sig") as template:
+        reader = csv.DictReader(template)
+        field = all956.Fields()
+        purchase, reversal = [field.compose(row, reader.fieldnames) for row in reader]
+
+    async def exchange(config, messages):
+        server = await listener.serve("127.0.0.1", 0, config)
+        connection = Connection(server.sockets[0].getsockname())
+        await connection.open()
+        responses = [await connection.exchange(message) for message in messages]
+        await connection.close()
+        server.close()
+        return [field.parse(response) for response in responses]
+
+    approved, reversed, repeated = asyncio.run(exchange(listener.Config(), [purchase, reversal, "1421" + reversal[4:]]))
+    assert (approved[0], approved[11], approved[39]) == ("1110", field.parse(purchase)[11], "000")
+    assert len(approved[38]) == 6
+    assert (reversed[0], reversed[37], reversed[39]) == ("1430", field.parse(reversal)[37], "400")
+    assert (repeated[0], repeated[39]) == ("1430", "400")
+
+    declined, = asyncio.run(exchange(listener.Config(rules=[(2, "^5", "116")]), [purchase]))
+    assert (declined[39], declined[38]) == ("116", "")
+
+
+def test_load_generator():
+    fieldnames, rows = load.workload("in/t.csv", {"Withdrawal": 1, "Refund": 0}, seed=1)
+    assert {next(rows)["Preset"] for i in range(20)} == {"Withdrawal"}
+
+    async def generate():
+        server = await listener.serve("127.0.0.1", 0, listener.Config())
+        pool = Pool(server.sockets[0].getsockname())
+        await pool.open()
+        generator = load.Generator(pool, load.workload("in/t.csv", {})[1], fieldnames)
+        await generator.run(200, 0.5)
+        await pool.close()
+        server.close()
+        return generator.results(200, 0.5)
+
+    results = asyncio.run(generate())
+    assert results["sent"] == 100 and results["timeouts"] == 0 and results["skipped"] == 0
+    assert results["response_codes"] == {"000": 50, "400": 50}
+    assert results["stats"]["stages"]["latency"]["count"] == 100
+
+    # Sign on and echo responses are network management, not transactions
+    assert "800" not in metrics.collector.responses
+
+    merged = load.merge([results, results])
+    assert merged["sent"] == 200 and merged["response_codes"] == {"000": 100, "400": 100}
+    assert merged["stats"]["stages"]["latency"]["count"] == 200 and merged["workers"] == 2